@@ -0,0 +1,125 @@
+"""
+Сверка компилированного нормализатора с эталонными посимвольными функциями
+и замер пропускной способности.
+
+    python bench_normalizer.py [--fuzz 200000] [--corpus opennet_news.json]
+
+Без --corpus throughput меряется на синтетическом тексте.
+"""
+import argparse
+import random
+import time
+
+import text_normalizer as tn
+
+# Пары (быстрая функция, эталон)
+PAIRS = [
+    (tn.clean_text, tn.clean_text_reference),
+    (tn.insert_spaces_around_tags, tn.insert_spaces_around_tags_reference),
+    (tn.fast_fix_word_glues, tn.fix_word_glues),
+    (tn.fast_normalize_spaces, tn.normalize_spaces),
+    (tn.fast_remove_control_chars, tn.remove_control_chars),
+]
+
+# Граничные случаи, на которых эталон ведёт себя неочевидно
+EQUIVALENCE_CORPUS = [
+    "",
+    "   ",
+    "Linux6.8 и ядро5.10",
+    "D3D12 и d3d, а также X11",
+    "выпуск.Новая версия",
+    "v1.2.Release и 3.Точка после цифры",
+    "..Две точки.Подряд",
+    "(см. выше)Далее",
+    "OpenGL4.6и Vulkan1.3",
+    "кириллицаLatinкириллица",
+    "ЁжикHedgehogёжик",
+    "\tтаб\nперевод\rстроки\x0bи\x0c",
+    "управляющие\x00\x01\x7fсимволы",
+    "разделители\x1c\x1d\x1e\x1fгрупп",
+    "невидимые​‌‍﻿­символы",
+    "а​b и b​а",
+    "неразрывный\xa0пробел и em",
+    "&amp;&lt;b&gt; &nbsp;&quot;текст&quot; &#1040;&#x42;",
+    "&#9;таб-сущность&#10;и перевод",
+    "<p>Текст<b>жирный</b>ещё</p><br/>Новая",
+    "a<b>c</b>d<br>E",
+    "Σίγμα.Σ и ǅ титульный, Ⅻ римская",
+    "²³ надстрочные и Ⅻ1",
+    "snake_case_Name и _Под",
+    " ведущие и хвостовые пробелы  ",
+]
+
+ALPHABET = (
+    list("aBcDdZ09.)(<>&;#x _") + list("аЯёЁжЖ")
+    + ["\t", "\n", "\x00", "\x1c", "\x7f", "​", "­", "﻿", "\xa0", " ",
+       "Σ", "σ", "ǅ", "Ⅻ", "²", "&amp;", "&nbsp;", "&#1040;", "&#9;", "<b>", "</p>"]
+)
+
+
+def check_equivalence(samples):
+    failures = 0
+    for s in samples:
+        for fast, ref in PAIRS:
+            if fast(s) != ref(s):
+                failures += 1
+                print(f"[DIFF] {fast.__name__}({s!r}): {fast(s)!r} != {ref(s)!r}")
+    return failures
+
+
+def fuzz_samples(n, seed=0):
+    rnd = random.Random(seed)
+    for _ in range(n):
+        yield "".join(rnd.choice(ALPHABET) for _ in range(rnd.randint(0, 40)))
+
+
+def load_texts(path):
+    from corpus_io import iter_articles
+    texts = []
+    for item in iter_articles(path):
+        texts.append(item.get("content", ""))
+        texts.append(item.get("title", ""))
+    return texts
+
+
+def throughput(func, texts, repeat=3):
+    total = sum(len(t) for t in texts)
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for t in texts:
+            func(t)
+        best = min(best, time.perf_counter() - t0)
+    return total / best / 1e6, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сверка и бенчмарк text_normalizer")
+    parser.add_argument("--fuzz", type=int, default=200000)
+    parser.add_argument("--corpus", default=None, help="JSON/JSONL корпус статей для замера")
+    args = parser.parse_args()
+
+    failures = check_equivalence(EQUIVALENCE_CORPUS)
+    failures += check_equivalence(fuzz_samples(args.fuzz))
+    print(f"[CHECK] Расхождений: {failures}")
+
+    if args.corpus:
+        texts = load_texts(args.corpus)
+    else:
+        base = ("Компания NVIDIA выпустила драйвер 550.54(Vulkan 1.3)и OpenGL4.6.Новая "
+                "версия &quot;ядра&quot; Linux6.8 доступна для\tзагрузки. ")
+        texts = [base * 40] * 500
+        texts += [f"<p>Абзац<b>{i}</b>text<a href='x'>ссылка</a></p>" * 20 for i in range(500)]
+
+    for fast, ref in PAIRS[:2]:
+        fast_mbs, fast_t = throughput(fast, texts)
+        ref_mbs, ref_t = throughput(ref, texts)
+        print(f"[BENCH] {ref.__name__:40s} {ref_mbs:8.2f} Мсимв/с")
+        print(f"[BENCH] {fast.__name__:40s} {fast_mbs:8.2f} Мсимв/с  (x{ref_t / fast_t:.1f})")
+
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
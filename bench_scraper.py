@@ -0,0 +1,282 @@
+"""
+Офлайн-бенчмарк скрапера на локальной заглушке opennet.
+
+    python bench_scraper.py [--cache html_cache] [--pages 2000] [--latency 20]
+                            [--error-rate 0.02] [--missing-rate 0.1]
+                            [--backends threads,asyncio,pipeline] [--out bench_results.jsonl]
+
+Страницы берутся из кэша сырых HTML (--cache, см. HtmlCache) или генерируются.
+Задержки, 503 и 404 выбираются детерминированно по номеру статьи и --seed,
+поэтому прогоны на разных коммитах сравнимы между собой. Каждый сценарий
+выполняется в отдельном процессе, чтобы peak RSS и CPU не смешивались.
+Результаты дописываются строкой JSON в --out вместе с хешем коммита.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+FIRST_NUM = 100000
+
+_WORDS = ("ядро Linux выпуск версии драйвер NVIDIA Vulkan OpenGL4.6 поддержка systemd "
+          "уязвимость пакет Debian12 Firefox Rust компилятор сервер Apache обновление").split()
+
+
+def synthetic_page(num: int) -> bytes:
+    rnd = random.Random(num)
+    title = " ".join(rnd.choice(_WORDS) for _ in range(8))
+    paragraphs = "".join(
+        "<p>" + " ".join(rnd.choice(_WORDS) for _ in range(60)) + ".Далее<b>важно</b>(см. ниже)Текст</p>\n"
+        for _ in range(rnd.randint(3, 12))
+    )
+    keywords = ", ".join(f'<a href="/keywords/{w}.html">{w}</a>' for w in rnd.sample(_WORDS, 3))
+    page = (
+        '<html><head><meta http-equiv="Content-Type" content="text/html; charset=koi8-r">'
+        f'<meta property="og:description" content="{title}"><title>{title}</title></head><body>'
+        '<table class="ttxt2"><tr><td class="chtext">'
+        f'<span id="r_title">{title}</span>{paragraphs}</td></tr></table>'
+        f'<span id="r_keyword_link">{keywords}</span>'
+        "<script>var counter = 1;</script></body></html>"
+    )
+    return page.encode("koi8-r", errors="replace")
+
+
+def load_corpus(cache_dir: str) -> List[Tuple[bytes, str]]:
+    from html_cache import HtmlCache
+    cache = HtmlCache(cache_dir)
+    pages = [(body, content_type) for _url, body, content_type in cache.iter_entries()]
+    cache.close()
+    return pages
+
+
+class StandIn:
+    """Локальный HTTP-сервер, изображающий opennet.ru/opennews/art.shtml?num="""
+
+    def __init__(self, pages: List[Tuple[bytes, str]], latency_ms: float = 0.0,
+                 error_rate: float = 0.0, missing_rate: float = 0.0, seed: int = 0):
+        self.pages = pages
+        self.latency = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.missing_rate = missing_rate
+        self.seed = seed
+        self.requests = 0
+        self._attempts: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/opennews/art.shtml?num={{}}"
+
+    def _verdict(self, num: int) -> Tuple[int, float]:
+        rnd = random.Random(num * 7919 + self.seed)
+        latency = self.latency * rnd.uniform(0.5, 1.5)
+        with self._lock:
+            self.requests += 1
+            attempt = self._attempts[num] = self._attempts.get(num, 0) + 1
+        if rnd.random() < self.missing_rate:
+            return 404, latency
+        # Ошибка только на первой попытке: так проверяется и путь повтора
+        if attempt == 1 and rnd.random() < self.error_rate:
+            return 503, latency
+        return 200, latency
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _serve(self, with_body: bool):
+                query = parse_qs(urlsplit(self.path).query)
+                num = int(query.get("num", ["0"])[0])
+                status, latency = stand_in._verdict(num)
+                time.sleep(latency)
+                self.send_response(status)
+                if status != 200:
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body, content_type = stand_in.pages[num % len(stand_in.pages)]
+                self.send_header("Content-Type", content_type or "text/html")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if with_body:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                self._serve(True)
+
+            def do_HEAD(self):
+                self._serve(False)
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _usage() -> Dict:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "cpu": own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+        # ru_maxrss в Linux - в килобайтах
+        "peak_rss_mb": max(own.ru_maxrss, children.ru_maxrss) / 1024,
+    }
+
+
+def _scenario_scrape_range(base_url, pages, backend, workers):
+    import scraper
+    scraper.BASE_URL = base_url
+    t0 = time.perf_counter()
+    articles = scraper.scrape_range(FIRST_NUM + pages - 1, pages, max_workers=workers,
+                                    request_delay=0, backend=backend)
+    return len(articles), time.perf_counter() - t0
+
+
+def _scenario_fetch_article(base_url, pages, parser):
+    import scraper
+    scraper.BASE_URL = base_url
+    session = scraper.make_session(pool_size=1)
+    t0 = time.perf_counter()
+    count = sum(1 for num in range(FIRST_NUM, FIRST_NUM + pages)
+                if scraper.fetch_article(num, delay=0, session=session, parser=parser))
+    return count, time.perf_counter() - t0
+
+
+def _scenario_parse(pages_data, parser):
+    import scraper
+    t0 = time.perf_counter()
+    count = 0
+    for i, (body, content_type) in enumerate(pages_data):
+        encoding = scraper.detect_encoding(body, content_type)
+        if scraper.parse_page(i, "", body, parser=parser, encoding=encoding)[1]:
+            count += 1
+    return count, time.perf_counter() - t0
+
+
+def _scenario_clean_text(texts, func_name):
+    import text_normalizer
+    func = getattr(text_normalizer, func_name)
+    t0 = time.perf_counter()
+    for text in texts:
+        func(text)
+    return len(texts), time.perf_counter() - t0
+
+
+SCENARIOS = {
+    "scrape_range": _scenario_scrape_range,
+    "fetch_article": _scenario_fetch_article,
+    "parse": _scenario_parse,
+    "clean_text": _scenario_clean_text,
+}
+
+
+def _run_child(queue, name, args):
+    import contextlib
+    before = _usage()
+    # Построчные [REQ] и прочий вывод скрапера не должен влиять на замер
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        count, elapsed = SCENARIOS[name](*args)
+    after = _usage()
+    queue.put({
+        "items": count,
+        "seconds": round(elapsed, 3),
+        "items_per_sec": round(count / elapsed, 1) if elapsed else None,
+        "cpu_ms_per_item": round((after["cpu"] - before["cpu"]) * 1000 / max(count, 1), 3),
+        "peak_rss_mb": round(after["peak_rss_mb"], 1),
+    })
+
+
+def run_isolated(name: str, *args) -> Dict:
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_child, args=(queue, name, args))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк скрапера opennet")
+    parser.add_argument("--cache", default=None, help="каталог HtmlCache с записанными страницами")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=20.0, help="средняя задержка ответа, мс")
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--missing-rate", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backends", default="threads,asyncio,pipeline")
+    parser.add_argument("--parsers", default="lxml,bs4")
+    parser.add_argument("--out", default="bench_results.jsonl")
+    args = parser.parse_args()
+
+    if args.cache:
+        corpus = load_corpus(args.cache)
+    else:
+        corpus = [(synthetic_page(n), "text/html; charset=koi8-r") for n in range(200)]
+    print(f"[BENCH] Страниц в корпусе: {len(corpus)}, коммит: {git_revision()}")
+
+    results = {}
+    with StandIn(corpus, args.latency, args.error_rate, args.missing_rate, args.seed) as stand_in:
+        for backend in args.backends.split(","):
+            results[f"scrape_range[{backend}]"] = run_isolated(
+                "scrape_range", stand_in.base_url, args.pages, backend, args.workers)
+        for parser_name in args.parsers.split(","):
+            results[f"fetch_article[{parser_name}]"] = run_isolated(
+                "fetch_article", stand_in.base_url, min(args.pages, 200), parser_name)
+
+    for parser_name in args.parsers.split(","):
+        results[f"parse[{parser_name}]"] = run_isolated("parse", corpus, parser_name)
+
+    import scraper
+    texts = []
+    for i, (body, content_type) in enumerate(corpus):
+        article = scraper.parse_page(i, "", body, encoding=scraper.detect_encoding(body, content_type))[1]
+        if article:
+            texts.append(article["content"])
+    for func_name in ("clean_text", "clean_text_reference",
+                      "insert_spaces_around_tags", "insert_spaces_around_tags_reference"):
+        results[f"{func_name}"] = run_isolated("clean_text", texts, func_name)
+
+    for name, r in results.items():
+        print(f"[BENCH] {name:45s} {r['items_per_sec'] or 0:10.1f}/с  "
+              f"CPU {r['cpu_ms_per_item']:8.3f} мс/шт  RSS {r['peak_rss_mb']:7.1f} МБ")
+
+    record = {
+        "revision": git_revision(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "results": results,
+    }
+    with open(args.out, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    print(f"[FILE] Результаты дописаны в {args.out}")
+
+
+if __name__ == "__main__":
+    main()
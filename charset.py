@@ -0,0 +1,108 @@
+import codecs
+import json
+import os
+import re
+from collections import Counter
+from threading import Lock
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from requests.compat import chardet
+
+_HEADER_CHARSET_RE = re.compile(r"charset\s*=\s*[\"']?([\w.:-]+)", re.I)
+_META_CHARSET_RE = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?([\w.:-]+)", re.I)
+
+
+def normalize_encoding(name: Optional[str]) -> Optional[str]:
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name.strip().lower()).name
+    except LookupError:
+        return None
+
+
+def section_of(url: Optional[str]) -> Optional[str]:
+    """Раздел сайта: хост + каталог, например www.opennet.ru/opennews"""
+    if not url:
+        return None
+    parts = urlsplit(url)
+    return parts.netloc + parts.path.rsplit("/", 1)[0]
+
+
+class CharsetResolver:
+    """
+    Определение кодировки страницы по цепочке от дешёвого к дорогому:
+    заголовок Content-Type -> <meta charset> в начале документа -> кодировка,
+    выученная для раздела сайта -> статистический детектор (chardet /
+    charset_normalizer, как r.apparent_encoding) -> utf-8. В stats
+    считается, каким путём была найдена кодировка.
+    """
+
+    def __init__(self, path: Optional[str] = None, sniff_bytes: int = 4096,
+                 learn_after: int = 20):
+        self.path = path
+        self.sniff_bytes = sniff_bytes
+        self.learn_after = learn_after
+        self.stats = Counter()
+        self._seen: Dict[str, Counter] = {}
+        self._learned: Dict[str, str] = {}
+        self._lock = Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._learned = json.load(f)
+
+    def _learn(self, section: Optional[str], encoding: str):
+        if not section:
+            return
+        seen = self._seen.setdefault(section, Counter())
+        seen[encoding] += 1
+        top, count = seen.most_common(1)[0]
+        # Запоминаем, только если раздел стабильно отдаёт одну кодировку
+        if count >= self.learn_after and count == sum(seen.values()):
+            self._learned[section] = top
+
+    def resolve(self, body: bytes, content_type: Optional[str] = None,
+                url: Optional[str] = None) -> str:
+        section = section_of(url)
+        with self._lock:
+            if content_type:
+                m = _HEADER_CHARSET_RE.search(content_type)
+                encoding = normalize_encoding(m.group(1)) if m else None
+                if encoding:
+                    self.stats["header"] += 1
+                    self._learn(section, encoding)
+                    return encoding
+
+            m = _META_CHARSET_RE.search(body[:self.sniff_bytes])
+            encoding = normalize_encoding(m.group(1).decode("ascii", "ignore")) if m else None
+            if encoding:
+                self.stats["meta"] += 1
+                self._learn(section, encoding)
+                return encoding
+
+            if section in self._learned:
+                self.stats["learned"] += 1
+                return self._learned[section]
+
+        encoding = normalize_encoding(chardet.detect(body)["encoding"])
+        with self._lock:
+            if encoding:
+                self.stats["detect"] += 1
+                return encoding
+            self.stats["default"] += 1
+        return "utf-8"
+
+    def decode(self, body: bytes, content_type: Optional[str] = None,
+               url: Optional[str] = None) -> str:
+        return body.decode(self.resolve(body, content_type, url), errors="replace")
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {"paths": dict(self.stats), "learned": dict(self._learned)}
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock, open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self._learned, f, ensure_ascii=False, indent=2)
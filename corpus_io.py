@@ -0,0 +1,230 @@
+import gzip
+import heapq
+import io
+import json
+import os
+import tempfile
+import zlib
+from threading import Lock
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSED_EXTS = (".gz", ".zst")
+# Чем обрывается сжатый файл, если писавший процесс убит до закрытия
+_TRUNCATED_ERRORS = (EOFError, zlib.error) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+
+def open_text(path: str, mode: str = "r"):
+    """Открывает файл в текстовом режиме, сжатие выбирается по расширению (.gz / .zst)"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("Для .zst нужен пакет zstandard")
+        raw = open(path, mode + "b")
+        if mode == "r":
+            stream = zstandard.ZstdDecompressor().stream_reader(
+                raw, closefd=True, read_across_frames=True)
+        else:
+            stream = zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+
+    return open(path, mode, encoding="utf-8")
+
+
+def part_path(path: str, n: int) -> str:
+    """out.jsonl.gz -> out.jsonl.part1.gz"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.part{n}{ext}"
+
+
+def jsonl_parts(path: str) -> List[str]:
+    """
+    Сжатый JSONL дописывается не в тот же файл, а новыми частями: после kill
+    последний член gzip/кадр zstd остаётся без концовки, и склеенный с ним
+    следующий поток не читается. Части читаются по порядку.
+    """
+    parts = [path]
+    if path.endswith(COMPRESSED_EXTS):
+        while os.path.exists(part_path(path, len(parts))):
+            parts.append(part_path(path, len(parts)))
+    return parts
+
+
+def iter_jsonl(path: str) -> Iterator[Dict]:
+    for part in jsonl_parts(path):
+        with open_text(part, "r") as f:
+            try:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        yield json.loads(line)
+            except _TRUNCATED_ERRORS as e:
+                # Сброшенные flush() записи читаются, оборванная последняя строка - нет
+                print(f"[WARN] {part}: файл оборван ({e!r}), прочитаны записи до обрыва")
+
+
+def iter_json_array(path: str, buffer_size: int = 1 << 20) -> Iterator[Dict]:
+    """Потоковое чтение JSON-массива объектов: в памяти буфер, а не весь файл"""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = ""
+        pos = 0
+        while True:
+            chunk = f.read(buffer_size)
+            buf = buf[pos:] + chunk
+            pos = 0
+            while True:
+                # Между элементами верхнего уровня - только пробелы, '[' и ','
+                while pos < len(buf) and buf[pos] in " \t\r\n,[":
+                    pos += 1
+                if pos >= len(buf):
+                    break
+                if buf[pos] == "]":
+                    return
+                try:
+                    obj, pos_end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if not chunk:
+                        raise
+                    # Объект обрезан границей буфера - дочитываем
+                    break
+                pos = pos_end
+                yield obj
+            if not chunk:
+                return
+
+
+def iter_articles(path: str) -> Iterator[Dict]:
+    """Читает корпус в старом формате (JSON-массив), в JSONL и в .corpus"""
+    if path.endswith(".json"):
+        yield from iter_json_array(path)
+    elif path.endswith(".corpus"):
+        from corpus_store import CorpusStore
+        with CorpusStore(path) as store:
+            yield from store
+    else:
+        yield from iter_jsonl(path)
+
+
+class JsonlSink:
+    """Потоковая запись статей в JSONL: каждая статья попадает на диск сразу после парсинга"""
+
+    def __init__(self, path: str, append: bool = True, flush_every: int = 50):
+        self.path = path
+        self.flush_every = flush_every
+        self.count = 0
+        self._lock = Lock()
+        parts = jsonl_parts(path)
+        if path.endswith(COMPRESSED_EXTS) and not append:
+            for part in parts[1:]:
+                os.remove(part)
+        elif path.endswith(COMPRESSED_EXTS) and os.path.exists(path) and os.path.getsize(path) > 0:
+            # Прошлый запуск мог оборваться посреди сжатого потока - дописываем новой частью
+            self.path = part_path(path, len(parts))
+        self._f = open_text(self.path, "a" if append else "w")
+
+    def write(self, article: Dict):
+        line = json.dumps(article, ensure_ascii=False)
+        with self._lock:
+            self._f.write(line + "\n")
+            self.count += 1
+            if self.count % self.flush_every == 0:
+                self._f.flush()
+
+    __call__ = write
+
+    def flush(self):
+        with self._lock:
+            self._f.flush()
+
+    def close(self):
+        with self._lock:
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_sink(path: str, append: bool = True):
+    """Потоковый приёмник статей по расширению: .corpus - CorpusWriter, иначе JsonlSink"""
+    if path.endswith(".corpus"):
+        from corpus_store import CorpusWriter
+        return CorpusWriter(path, append=append)
+    return JsonlSink(path, append=append)
+
+
+def _article_key(article: Dict) -> int:
+    return int(article["id"])
+
+
+def _write_run(chunk: List[Dict], tmp_dir: str) -> str:
+    chunk.sort(key=_article_key, reverse=True)
+    fd, run_path = tempfile.mkstemp(suffix=".jsonl", dir=tmp_dir)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        for article in chunk:
+            f.write(json.dumps(article, ensure_ascii=False) + "\n")
+    return run_path
+
+
+def _dedup_ids(articles: Iterator[Dict]) -> Iterator[Dict]:
+    last_id = None
+    for article in articles:
+        if article["id"] != last_id:
+            last_id = article["id"]
+            yield article
+
+
+def sort_jsonl(in_path: str, out_path: str, chunk_size: int = 5000,
+               tmp_dir: Optional[str] = None, dedup=None) -> int:
+    """
+    Офлайн-сортировка корпуса (JSONL, JSON или .corpus) по id (по убыванию, как в scrape_range) внешним слиянием:
+    в памяти держится не больше chunk_size статей. Дубликаты id отбрасываются.
+    Если out_path оканчивается на .json, пишется JSON-массив для старых потребителей,
+    если на .corpus - компактный корпус с индексом по id (см. corpus_store).
+    Если передан dedup (DedupIndex), метки dup_of заменяются его итоговым решением.
+    """
+    runs = []
+    chunk = []
+    for article in iter_articles(in_path):
+        if dedup is not None:
+            dedup.relabel(article)
+        chunk.append(article)
+        if len(chunk) >= chunk_size:
+            runs.append(_write_run(chunk, tmp_dir))
+            chunk = []
+    if chunk:
+        runs.append(_write_run(chunk, tmp_dir))
+
+    as_array = out_path.endswith(".json")
+    written = 0
+    try:
+        merged = heapq.merge(*(iter_jsonl(r) for r in runs), key=_article_key, reverse=True)
+        if out_path.endswith(".corpus"):
+            from corpus_store import write_corpus
+            return write_corpus(_dedup_ids(merged), out_path)
+        with open_text(out_path, "w") as out:
+            if as_array:
+                out.write("[\n")
+            for article in _dedup_ids(merged):
+                line = json.dumps(article, ensure_ascii=False)
+                if as_array:
+                    out.write((",\n" if written else "") + line)
+                else:
+                    out.write(line + "\n")
+                written += 1
+            if as_array:
+                out.write("\n]\n")
+    finally:
+        for r in runs:
+            os.remove(r)
+
+    return written
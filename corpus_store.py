@@ -0,0 +1,257 @@
+import bisect
+import json
+import mmap
+import os
+import struct
+import zlib
+from threading import Lock
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Формат .corpus: заголовок MAGIC + байт кодека, затем записи. Запись статьи -
+# два сжатых кадра подряд: "мета" (все поля, кроме content) и content, чтобы
+# сканы заголовков/ключевых слов не распаковывали и даже не трогали тексты.
+# Рядом лежит .corpus.idx - отсортированные по id записи фиксированной длины
+# (id, смещение, длина мета-кадра, длина кадра content), поиск по нему бинарный.
+# Пока корпус пишется, те же записи в порядке появления дописываются в журнал
+# .corpus.idx.log (после сброса кадров на диск). close() собирает из журнала
+# .idx и удаляет журнал; после kill читатель восстанавливает индекс из журнала.
+MAGIC = b"OPNCORP1"
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CONTENT_FIELD = "content"
+
+_ENTRY = struct.Struct("<QQII")
+
+
+def index_path(path: str) -> str:
+    return path + ".idx"
+
+
+def journal_path(path: str) -> str:
+    return path + ".idx.log"
+
+
+class _Codec:
+    def __init__(self, codec: int, level: Optional[int] = None):
+        self.codec = codec
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("Корпус сжат zstd, нужен пакет zstandard")
+            self._compressor = zstandard.ZstdCompressor(level=level or 6)
+            self._decompressor = zstandard.ZstdDecompressor()
+        self.level = level or 6
+
+    def compress(self, data: bytes) -> bytes:
+        if self.codec == CODEC_ZSTD:
+            return self._compressor.compress(data)
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data) -> bytes:
+        if self.codec == CODEC_ZSTD:
+            return self._decompressor.decompress(data)
+        return zlib.decompress(data)
+
+
+def _read_index(path: str) -> Dict[int, Tuple[int, int, int]]:
+    """Индекс вместе с журналом незакрытой записи; более поздняя запись id побеждает"""
+    entries = {}
+    size = os.path.getsize(path)
+    for part in (index_path(path), journal_path(path)):
+        if not os.path.exists(part):
+            continue
+        with open(part, "rb") as f:
+            data = f.read()
+        # Журнал мог оборваться посреди записи
+        data = data[:len(data) - len(data) % _ENTRY.size]
+        for article_id, offset, meta_len, content_len in _ENTRY.iter_unpack(data):
+            if offset + meta_len + content_len <= size:
+                entries[article_id] = (offset, meta_len, content_len)
+    return entries
+
+
+class CorpusWriter:
+    """
+    Запись корпуса в .corpus. Подходит как on_article для scrape_nums (как
+    JsonlSink): потокобезопасна, при append=True дописывает к существующему
+    корпусу. Статья с уже записанным id заменяет прежнюю (старые байты
+    остаются в файле до перепаковки через sort_jsonl/convert).
+    Каждые flush_every статей и по flush() кадры сбрасываются на диск, а их
+    записи индекса - в журнал; сортированный индекс пишется при close().
+    """
+
+    def __init__(self, path: str, append: bool = True, level: Optional[int] = None,
+                 flush_every: int = 50):
+        self.path = path
+        self.flush_every = flush_every
+        self.count = 0
+        self._pending = []
+        self._lock = Lock()
+        exists = append and os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            with open(path, "rb") as f:
+                header = f.read(len(MAGIC) + 1)
+            if header[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path}: не файл корпуса")
+            self._codec = _Codec(header[-1], level)
+            self._entries = _read_index(path)
+            self._f = open(path, "ab")
+            self._journal = open(journal_path(path), "ab")
+        else:
+            self._codec = _Codec(CODEC_ZSTD if zstandard is not None else CODEC_ZLIB, level)
+            self._entries = {}
+            self._f = open(path, "wb")
+            self._f.write(MAGIC + bytes([self._codec.codec]))
+            self._journal = open(journal_path(path), "wb")
+        self._offset = self._f.tell()
+
+    def write(self, article: Dict):
+        meta = {k: v for k, v in article.items() if k != CONTENT_FIELD}
+        meta_frame = self._codec.compress(json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+        content_frame = self._codec.compress((article.get(CONTENT_FIELD) or "").encode("utf-8"))
+        with self._lock:
+            self._f.write(meta_frame)
+            self._f.write(content_frame)
+            entry = (self._offset, len(meta_frame), len(content_frame))
+            self._entries[int(article["id"])] = entry
+            self._pending.append(_ENTRY.pack(int(article["id"]), *entry))
+            self._offset += len(meta_frame) + len(content_frame)
+            self.count += 1
+            if self.count % self.flush_every == 0:
+                self._flush()
+
+    __call__ = write
+
+    def _flush(self):
+        # Сначала кадры, потом журнал: запись журнала не должна опережать данные
+        self._f.flush()
+        if self._pending:
+            self._journal.write(b"".join(self._pending))
+            self._journal.flush()
+            self._pending = []
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._f.close()
+            self._journal.close()
+            tmp = index_path(self.path) + ".tmp"
+            with open(tmp, "wb") as f:
+                for article_id in sorted(self._entries):
+                    f.write(_ENTRY.pack(article_id, *self._entries[article_id]))
+            os.replace(tmp, index_path(self.path))
+            os.remove(journal_path(self.path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CorpusStore:
+    """
+    Чтение .corpus через mmap: get(id) распаковывает одну статью,
+    scan(fields) проходит по корпусу, распаковывая content только если
+    он запрошен. Порядок обхода - по id по убыванию, как в scrape_range.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: не файл корпуса")
+        self._codec = _Codec(self._data[len(MAGIC)])
+        self._index_file = None
+        if os.path.exists(journal_path(path)) or not os.path.exists(index_path(path)):
+            # Запись не завершилась (kill, сбой): индекс собирается в памяти из журнала
+            entries = _read_index(path)
+            self._index = b"".join(_ENTRY.pack(i, *entries[i]) for i in sorted(entries))
+            self._count = len(entries)
+            return
+        self._index_file = open(index_path(path), "rb")
+        size = os.fstat(self._index_file.fileno()).st_size
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._count = size // _ENTRY.size
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _entry(self, i: int) -> Tuple[int, int, int, int]:
+        return _ENTRY.unpack_from(self._index, i * _ENTRY.size)
+
+    def _find(self, article_id: int) -> Optional[Tuple[int, int, int, int]]:
+        i = bisect.bisect_left(range(self._count), article_id, key=lambda j: self._entry(j)[0])
+        if i < self._count:
+            entry = self._entry(i)
+            if entry[0] == article_id:
+                return entry
+        return None
+
+    def __contains__(self, article_id) -> bool:
+        return self._find(int(article_id)) is not None
+
+    def _meta(self, offset: int, meta_len: int) -> Dict:
+        return json.loads(self._codec.decompress(self._data[offset:offset + meta_len]))
+
+    def _content(self, offset: int, meta_len: int, content_len: int) -> str:
+        start = offset + meta_len
+        return self._codec.decompress(self._data[start:start + content_len]).decode("utf-8")
+
+    def get(self, article_id) -> Optional[Dict]:
+        entry = self._find(int(article_id))
+        if entry is None:
+            return None
+        _id, offset, meta_len, content_len = entry
+        article = self._meta(offset, meta_len)
+        article[CONTENT_FIELD] = self._content(offset, meta_len, content_len)
+        return article
+
+    def ids(self) -> List[str]:
+        return [str(self._entry(i)[0]) for i in range(self._count - 1, -1, -1)]
+
+    def scan(self, fields: Optional[Iterable[str]] = None) -> Iterator[Dict]:
+        """Статьи только с полями fields (None - все поля)"""
+        fields = list(fields) if fields is not None else None
+        with_content = fields is None or CONTENT_FIELD in fields
+        for i in range(self._count - 1, -1, -1):
+            _id, offset, meta_len, content_len = self._entry(i)
+            article = self._meta(offset, meta_len)
+            if with_content:
+                article[CONTENT_FIELD] = self._content(offset, meta_len, content_len)
+            if fields is not None:
+                article = {k: article.get(k) for k in fields}
+            yield article
+
+    def __iter__(self) -> Iterator[Dict]:
+        return self.scan()
+
+    def close(self):
+        self._data.close()
+        self._file.close()
+        if self._index_file is not None:
+            if self._count:
+                self._index.close()
+            self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_corpus(articles: Iterable[Dict], path: str, level: Optional[int] = None) -> int:
+    with CorpusWriter(path, append=False, level=level) as writer:
+        for article in articles:
+            writer.write(article)
+    return writer.count
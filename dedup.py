@@ -0,0 +1,161 @@
+import hashlib
+import os
+import re
+import struct
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+_WORD_RE = re.compile(r"\w+")
+
+# Запись файла индекса: id, dup_of (0 - оригинал), затем сигнатура
+_HEADER = struct.Struct("<QQ")
+
+
+class DedupIndex:
+    """
+    Поиск почти-дубликатов статей (перепечатки release notes, исправления)
+    по MinHash-сигнатурам текста после clean_text. Шинглы - тройки слов,
+    num_perm независимых 32-битных хешей шингла берутся из одного вызова
+    shake_128. LSH: сигнатура режется на bands полос, кандидаты - статьи,
+    совпавшие хотя бы в одной полосе; кандидат считается дубликатом, если
+    оценка сходства Жаккара не ниже threshold. Оригиналом считается статья
+    с наименьшим id в группе, независимо от порядка загрузки; dup_of всегда
+    указывает на оригинал, а не на другой дубль. Если более старая статья
+    приходит позже, группа переназначается на неё (repointed), а уже
+    записанные метки исправляет relabel() - например, при --sort.
+    """
+
+    def __init__(self, path: Optional[str] = None, num_perm: int = 64, bands: int = 16,
+                 threshold: float = 0.8, shingle_size: int = 3):
+        if num_perm % bands:
+            raise ValueError("num_perm должно делиться на bands")
+        self.path = path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.checked = 0
+        self.duplicates = 0
+        self.repointed = 0
+        self._unpack = struct.Struct(f"<{num_perm}I")
+        self._signatures: Dict[str, Tuple[int, ...]] = {}
+        self._dup_of: Dict[str, str] = {}
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[str]] = {}
+        self._lock = Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    def shingles(self, text: str) -> set:
+        words = _WORD_RE.findall(text.lower())
+        k = self.shingle_size
+        if len(words) <= k:
+            return {" ".join(words)}
+        return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        size = self.num_perm * 4
+        unpack = self._unpack.unpack
+        rows = [unpack(hashlib.shake_128(s.encode("utf-8")).digest(size)) for s in self.shingles(text)]
+        # Транспонирование и минимум по столбцам целиком на стороне C
+        return tuple(map(min, zip(*rows)))
+
+    def similarity(self, a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+        return sum(x == y for x, y in zip(a, b)) / self.num_perm
+
+    def _band_keys(self, sig: Tuple[int, ...]):
+        r = self.rows
+        return [(i, sig[i * r:(i + 1) * r]) for i in range(self.bands)]
+
+    def _query(self, sig: Tuple[int, ...]) -> Optional[Tuple[str, float]]:
+        best = None
+        seen = set()
+        for key in self._band_keys(sig):
+            for candidate in self._buckets.get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                score = self.similarity(sig, self._signatures[candidate])
+                if score >= self.threshold and (best is None or score > best[1]):
+                    best = (candidate, score)
+        return best
+
+    def _add(self, article_id: str, sig: Tuple[int, ...], dup_of: Optional[str]):
+        self._signatures[article_id] = sig
+        if dup_of:
+            # Дубли в полосы не кладём: с ними совпадёт и оригинал
+            self._dup_of[article_id] = dup_of
+            return
+        for key in self._band_keys(sig):
+            self._buckets.setdefault(key, []).append(article_id)
+
+    def _repoint(self, old: str, new: str):
+        """Оригинал группы old становится дублем new вместе со всеми своими дублями"""
+        for member, original in self._dup_of.items():
+            if original == old:
+                self._dup_of[member] = new
+        self._dup_of[old] = new
+        # old остаётся в полосах: через него находятся похожие на всю группу
+        self.repointed += 1
+        self.duplicates += 1
+
+    def check(self, article: Dict, sig: Optional[Tuple[int, ...]] = None) -> Optional[str]:
+        """Проставляет article['dup_of'], если статья - почти-дубль уже виденной; возвращает id оригинала"""
+        article_id = str(article["id"])
+        if sig is None:
+            sig = self.signature(article.get("content") or "")
+        with self._lock:
+            self.checked += 1
+            if article_id in self._signatures:
+                # Повторная загрузка того же номера (докачка, replay): решение уже принято
+                dup_of = self._dup_of.get(article_id)
+            else:
+                match = self._query(sig)
+                dup_of = self._dup_of.get(match[0], match[0]) if match else None
+                if dup_of and int(dup_of) > int(article_id):
+                    self._repoint(dup_of, article_id)
+                    dup_of = None
+                self._add(article_id, sig, dup_of)
+            if dup_of:
+                self.duplicates += 1
+                article["dup_of"] = dup_of
+            return dup_of
+
+    def relabel(self, article: Dict) -> bool:
+        """Приводит article['dup_of'] к текущему решению индекса; True, если метка изменилась"""
+        article_id = str(article["id"])
+        with self._lock:
+            if article_id not in self._signatures:
+                # Статья этим индексом не проверялась - метку не трогаем
+                return False
+            dup_of = self._dup_of.get(article_id)
+        if article.get("dup_of") == dup_of:
+            return False
+        if dup_of:
+            article["dup_of"] = dup_of
+        else:
+            article.pop("dup_of", None)
+        return True
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _load(self):
+        size = _HEADER.size + self._unpack.size
+        with open(self.path, "rb") as f:
+            data = f.read()
+        for offset in range(0, len(data) - size + 1, size):
+            article_id, dup_of = _HEADER.unpack_from(data, offset)
+            sig = self._unpack.unpack_from(data, offset + _HEADER.size)
+            self._add(str(article_id), sig, str(dup_of) if dup_of else None)
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with self._lock, open(tmp, "wb") as f:
+            for article_id, sig in self._signatures.items():
+                dup_of = self._dup_of.get(article_id)
+                f.write(_HEADER.pack(int(article_id), int(dup_of) if dup_of else 0))
+                f.write(self._unpack.pack(*sig))
+        os.replace(tmp, self.path)
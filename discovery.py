@@ -0,0 +1,154 @@
+import bisect
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Optional
+
+# exists(num) -> True (статья есть), False (точно нет), None (не удалось понять)
+ExistsProbe = Callable[[int], Optional[bool]]
+
+
+class GapMap:
+    """
+    Карта дыр в нумерации: подтверждённо отсутствующие номера, хранимые
+    отсортированными непересекающимися диапазонами [start, end]. Сохраняется
+    в JSON между запусками, чтобы не платить GET за удалённые номера повторно.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.ranges: List[List[int]] = []
+        self._lock = Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.ranges = [list(r) for r in json.load(f)["missing"]]
+
+    def _find(self, num: int) -> int:
+        return bisect.bisect_right(self.ranges, [num, float("inf")]) - 1
+
+    def is_missing(self, num: int) -> bool:
+        with self._lock:
+            i = self._find(num)
+            return i >= 0 and self.ranges[i][0] <= num <= self.ranges[i][1]
+
+    def add(self, num: int):
+        with self._lock:
+            i = self._find(num)
+            if i >= 0 and self.ranges[i][0] <= num <= self.ranges[i][1]:
+                return
+            joins_left = i >= 0 and self.ranges[i][1] == num - 1
+            joins_right = i + 1 < len(self.ranges) and self.ranges[i + 1][0] == num + 1
+            if joins_left and joins_right:
+                self.ranges[i][1] = self.ranges[i + 1][1]
+                del self.ranges[i + 1]
+            elif joins_left:
+                self.ranges[i][1] = num
+            elif joins_right:
+                self.ranges[i + 1][0] = num
+            else:
+                self.ranges.insert(i + 1, [num, num])
+
+    def discard(self, num: int):
+        """Номер оказался живым (например, статью восстановили)"""
+        with self._lock:
+            i = self._find(num)
+            if i < 0 or not (self.ranges[i][0] <= num <= self.ranges[i][1]):
+                return
+            start, end = self.ranges[i]
+            parts = [[start, num - 1]] if start < num else []
+            if num < end:
+                parts.append([num + 1, end])
+            self.ranges[i:i + 1] = parts
+
+    def missing_count(self) -> int:
+        return sum(end - start + 1 for start, end in self.ranges)
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with self._lock, open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"missing": self.ranges}, f)
+        os.replace(tmp, self.path)
+
+
+class CachedProbe:
+    """Запоминает ответы пробы, чтобы поиск не спрашивал один номер дважды"""
+
+    def __init__(self, exists: ExistsProbe):
+        self.exists = exists
+        self.known: Dict[int, Optional[bool]] = {}
+        self.requests = 0
+
+    def __call__(self, num: int) -> Optional[bool]:
+        if num not in self.known:
+            self.requests += 1
+            self.known[num] = self.exists(num)
+        return self.known[num]
+
+
+def find_newest(exists: ExistsProbe, hint: int, window: int = 5) -> int:
+    """
+    Ищет номер самой свежей статьи: экспоненциально шагаем вверх от hint, пока
+    в окне из window номеров встречаются живые статьи, затем бинарным поиском
+    находим границу. Окно нужно из-за дыр от удалённых статей.
+    """
+    probe = CachedProbe(exists)
+
+    def alive(n: int) -> bool:
+        return any(probe(m) for m in range(n, n + window))
+
+    lo = hint
+    step = 1
+    while not alive(lo):
+        # Подсказка оказалась выше последней статьи - спускаемся вниз
+        lo -= step
+        step *= 2
+        if lo <= 0:
+            return 0
+
+    step = 1
+    hi = lo + step
+    while alive(hi):
+        lo = hi
+        step *= 2
+        hi = lo + step
+
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if alive(mid):
+            lo = mid
+        else:
+            hi = mid
+
+    # alive(lo) и не alive(lo + 1): живой номер в окне lo - это сам lo
+    newest = max(m for m in range(lo, lo + window) if probe(m))
+    print(f"[DISCOVERY] Свежайшая статья: {newest} (проб: {probe.requests})")
+    return newest
+
+
+def filter_candidates(nums: Iterable[int], gap_map: Optional[GapMap] = None,
+                      exists: Optional[ExistsProbe] = None,
+                      probe_workers: int = 10) -> List[int]:
+    """
+    Отбрасывает номера, известные как дыры, а остальные (если задана дешёвая
+    проба, например HEAD) проверяет и оставляет только существующие или
+    неопределённые. Найденные дыры записываются в gap_map.
+    """
+    nums = [n for n in nums if not (gap_map and gap_map.is_missing(n))]
+    if exists is None:
+        return nums
+
+    with ThreadPoolExecutor(max_workers=probe_workers) as executor:
+        verdicts = list(executor.map(exists, nums))
+
+    kept = []
+    for num, verdict in zip(nums, verdicts):
+        if verdict is False:
+            if gap_map:
+                gap_map.add(num)
+        else:
+            kept.append(num)
+    print(f"[DISCOVERY] Проверено пробами: {len(nums)}, к загрузке: {len(kept)}")
+    return kept
@@ -0,0 +1,17 @@
+# Признаки документа для ранжировщика, не зависящие от запроса. index.py
+# считает их один раз при заливке и кладёт в _source, ранжировщик берёт готовые.
+DOC_FEATURES = ("content_short", "keywords_str", "title_len", "keywords_count", "content_len")
+
+
+def document_features(article):
+    keywords = article.get("keywords", [])
+    keywords_str = ", ".join(keywords) if isinstance(keywords, list) else (keywords or "")
+    # Первые два предложения - как и при обучении модели
+    content_short = ". ".join(str(article.get("content", "")).split(".")[:2]).strip() + "."
+    return {
+        "content_short": content_short,
+        "keywords_str": keywords_str,
+        "title_len": len(article.get("title", "")),
+        "keywords_count": keywords_str.count(",") + 1,
+        "content_len": len(content_short),
+    }
@@ -1,86 +1,188 @@
 import os
-import json
+import re
+import sys
+import time
+import secrets
+import hashlib
 import logging
+import argparse
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from elasticsearch import Elasticsearch, helpers
 
+# Читатели корпуса общие со скрапером и лежат в корне репозитория
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from corpus_io import iter_articles
+from doc_features import document_features
+from vectors import ENCODE_BATCH, load_encoder
+from speller import build_speller, scan_index
+
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 ES_HOST = "http://localhost:9200"
 INDEX_NAME = "opennet_news"
+# Корпус: opennet_news.json, JSONL от --stream или компактный opennet_news.corpus
 JSON_FILE = os.path.join(os.path.dirname(__file__), "..", "opennet_news.json")
+SYNONYMS_FILE = os.path.join(os.path.dirname(__file__), "synonyms.txt")
+SYNONYMS_SET = "opennet-synonyms"
+# Версия состава _source: входит в content_hash, чтобы после добавления
+# вычисляемых полей --incremental переотправил все документы (их схему
+# перед этим дописывает ensure_mapping)
+SOURCE_VERSION = "3"
+
+# Пачка bulk ограничена и числом документов, и размером запроса
+CHUNK_DOCS = 500
+CHUNK_BYTES = 10 * 1024 * 1024
+BULK_THREADS = 4
+BULK_RETRIES = 8
+REPORT_EVERY = 5.0
+
+# Режим массовой загрузки: без refresh и реплик на время заливки
+BULK_LOAD_SETTINGS = {"refresh_interval": "-1", "number_of_replicas": 0}
+# Асинхронный translog ускоряет заливку, но при падении узла теряются последние секунды
+ASYNC_TRANSLOG_SETTINGS = {"translog.durability": "async"}
+FORCE_MERGE_TIMEOUT = 3600
+WARM_QUERIES = ["linux", "ядро", "уязвимость", "firefox", "python"]
+
+# Поколения индекса: opennet_news-<время> за псевдонимом opennet_news
+GENERATION_FORMAT = "%Y%m%d-%H%M%S"
+# Поколения: <псевдоним>-<время>[-<мс><случайный суффикс>]; старые имена - без суффикса
+GENERATION_RE = r"-\d{8}-\d{6}(-\d{3}[0-9a-f]{4})?"
+# Временные индексы --measure-synonyms не должны попадать под шаблон поколений
+SCRATCH_PREFIX = f"{INDEX_NAME}_synbench"
+KEEP_GENERATIONS = 2
+# Новое поколение не должно быть заметно меньше текущего
+MIN_COUNT_RATIO = 0.9
+SMOKE_QUERIES = WARM_QUERIES
+
+# Инкрементальный режим: сколько документов можно удалить за раз без явного разрешения
+MAX_DELETE_RATIO = 0.1
+SCAN_SIZE = 5000
+
+# Плотные векторы для гибридного поиска - только если обучена модель (python vectors.py)
+ENCODER = load_encoder()
+HNSW_OPTIONS = {"type": "hnsw", "m": 16, "ef_construction": 100}
+
+# Автодополнение: completion-поле из заголовка и ключевых слов. Completion ищет
+# только с начала входа, поэтому кроме целого заголовка добавляем его хвосты
+# с каждого значимого слова: "ядро linux 6.6" находится и по "lin"
+SUGGEST_TAIL_WORDS = 6
+SUGGEST_MIN_WORD = 3
 
 es = Elasticsearch(ES_HOST)
 if not es.ping():
     logger.error("Не удалось подключиться к Elasticsearch")
     exit(1)
 
-def create_index(es_client, index_name):
+def load_synonyms(path=SYNONYMS_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def sync_synonyms(es_client, path=SYNONYMS_FILE):
+    """
+    Заливает правила из файла в набор синонимов Elasticsearch. Анализаторы,
+    ссылающиеся на набор, перечитывают его сами; reload_search_analyzers -
+    для уже открытых индексов, чтобы новые правила действовали сразу.
+    """
+    rules = load_synonyms(path)
+    es_client.synonyms.put_synonym(
+        id=SYNONYMS_SET,
+        synonyms_set=[{"id": f"rule-{i}", "synonyms": rule} for i, rule in enumerate(rules)],
+    )
+    if es_client.indices.exists(index=INDEX_NAME):
+        es_client.indices.reload_search_analyzers(index=INDEX_NAME)
+    logger.info(f"[INFO] Набор синонимов {SYNONYMS_SET}: {len(rules)} правил")
+    return len(rules)
+
+
+def index_settings(index_time_synonyms=False):
+    """
+    Синонимы раскрываются только при поиске (synonym_graph над обновляемым
+    набором): индекс не раздувается раскрытыми терминами, а правка списка не
+    требует переиндексации. index_time_synonyms=True - прежняя схема, нужна
+    только для сравнения в measure_synonym_modes.
+    """
+    base_filters = ["lowercase", "russian_stop", "russian_stemmer"]
+    filters = {
+        "russian_stop": {"type": "stop", "stopwords": "_russian_"},
+        "russian_stemmer": {"type": "stemmer", "language": "russian"},
+    }
+    # Без стемминга и стоп-слов: подсказка дополняет ровно то, что набрано
+    suggest_analyzer = {"tokenizer": "standard", "filter": ["lowercase"]}
+    text_field = {"type": "text", "analyzer": "russian_analyzer"}
+    if index_time_synonyms:
+        filters["russian_synonyms"] = {"type": "synonym", "synonyms": load_synonyms()}
+        analyzers = {
+            "russian_analyzer": {"tokenizer": "standard", "filter": base_filters + ["russian_synonyms"]},
+            "suggest_analyzer": suggest_analyzer,
+        }
+    else:
+        filters["russian_synonyms"] = {
+            "type": "synonym_graph",
+            "synonyms_set": SYNONYMS_SET,
+            "updateable": True,
+        }
+        analyzers = {
+            "russian_analyzer": {"tokenizer": "standard", "filter": base_filters},
+            "russian_search_analyzer": {"tokenizer": "standard", "filter": base_filters + ["russian_synonyms"]},
+            "suggest_analyzer": suggest_analyzer,
+        }
+        text_field["search_analyzer"] = "russian_search_analyzer"
+
     settings = {
         "settings": {
             "analysis": {
-                "filter": {
-                    "russian_stop": {"type": "stop", "stopwords": "_russian_"},
-                    "russian_stemmer": {"type": "stemmer", "language": "russian"},
-                    "russian_synonyms": {
-                        "type": "synonym",
-                        "synonyms": [
-                            "linux, ubuntu, fedora, debian, centos, rhel, opensuse, suse, линукс, убунту, федора, дебян, центос, рел, опенсусе, сусе",
-                            "windows, win, виндовс, вин, виндоус",
-                            "macos, mac, apple, макос, мак, эппл",
-                            "rust, раст, ржавый",
-                            "python, py, пайтон, питон",
-                            "javascript, js, джаваскрипт, жс, яваскрипт",
-                            "java, джава, ява",
-                            "gnome, гном",
-                            "plasma, плазма",
-                            "xfce, иксфце, иксфсе",
-                            "desktop, рабочий стол, десктоп",
-                            "wayland, вейленд, вяленый",
-                            "firefox, фаерфокс",
-                            "mozilla, мозилла",
-                            "chrome, google chrome, хром, гугл хром",
-                            "http, хттп",
-                            "https, хттпс",
-                            "apache, апаче",
-                            "server, сервер",
-                            "nvidia, нвидиа",
-                            "intel, интел",
-                            "gpu, графический процессор, видеокарта",
-                            "cpu, центральный процессор, цпу, процессор, цп",
-                            "vulkan, вулкан",
-                            "opengl, опенгл",
-                            "wine, вайн",
-                            "systemd, системд",
-                            "system, система",
-                            "shell, шелл, командная строка, консоль",
-                            "root, рут, администратор",
-                            "postgresql, postgres, постгрескьюэл, постгрес, постгря",
-                            "flatpak, флатпак",
-                            "raspberry, raspberry pi, распберри, распберри пи",
-                            "gplv, gpl, license, гпл, лицензия",
-                            "live, iso, лайв, айсо"
-                        ]
-                    }
-                },
-                "analyzer": {
-                    "russian_analyzer": {
-                        "tokenizer": "standard",
-                        "filter": ["lowercase", "russian_stop", "russian_stemmer", "russian_synonyms"]
-                    }
-                }
+                "filter": filters,
+                "analyzer": analyzers,
             }
         },
         "mappings": {
             "properties": {
                 "id": {"type": "keyword"},
                 "url": {"type": "keyword"},
-                "title": {"type": "text", "analyzer": "russian_analyzer"},
-                "content": {"type": "text", "analyzer": "russian_analyzer"},
-                "keywords": {"type": "keyword"} 
+                "title": dict(text_field),
+                "content": dict(text_field),
+                "keywords": {"type": "keyword"},
+                # Хеш для инкрементальной индексации: только хранится, не ищется
+                "content_hash": {"type": "keyword", "index": False},
+                # Готовые признаки ранжировщика (doc_features): только хранятся
+                "content_short": {"type": "text", "index": False},
+                "keywords_str": {"type": "keyword", "index": False, "doc_values": False},
+                "title_len": {"type": "integer", "index": False},
+                "keywords_count": {"type": "integer", "index": False},
+                "content_len": {"type": "integer", "index": False},
+                # Входы автодополнения (suggest_inputs): FST в памяти, ответ за миллисекунды
+                "suggest": {
+                    "type": "completion",
+                    "analyzer": "suggest_analyzer",
+                    "max_input_length": 100
+                }
             }
         }
     }
+    # Входы подсказок и вектор нужны только своим структурам, в _source их не храним
+    settings["mappings"]["_source"] = {"excludes": ["suggest"]}
+    if ENCODER:
+        settings["mappings"]["_source"]["excludes"].append("vector")
+        settings["mappings"]["properties"]["vector"] = {
+            "type": "dense_vector",
+            "dims": ENCODER.dims,
+            "index": True,
+            # Векторы нормированы, dot_product совпадает с косинусом и дешевле
+            "similarity": "dot_product",
+            "index_options": HNSW_OPTIONS,
+        }
+    return settings
+
+
+def create_index(es_client, index_name, index_time_synonyms=False):
+    settings = index_settings(index_time_synonyms)
+    if not index_time_synonyms:
+        # Набор должен существовать до создания индекса, который на него ссылается
+        sync_synonyms(es_client)
 
     if es_client.indices.exists(index=index_name):
         logger.info(f"[INFO] Индекс {index_name} уже существует, удаляем...")
@@ -90,38 +192,501 @@ def create_index(es_client, index_name):
     logger.info(f"[INFO] Индекс {index_name} создан успешно")
 
 
-def index_documents(es_client, index_name, json_file):
-    if not os.path.exists(json_file):
-        logger.error(f"Файл не найден: {json_file}")
-        return
+class _SharedIterator:
+    """Один поток документов на несколько потоков-отправителей"""
+
+    def __init__(self, iterable):
+        self._it = iter(iterable)
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._lock:
+            return next(self._it)
 
-    with open(json_file, "r", encoding="utf-8") as f:
-        news = json.load(f)
 
-    actions = [
-        {
+def content_hash(item):
+    """Хеш того, что видит поиск: заголовок, текст и ключевые слова"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(SOURCE_VERSION.encode("ascii"))
+    if ENCODER:
+        h.update(ENCODER.fingerprint.encode("ascii"))
+    for part in (item.get("title", ""), item.get("content", ""), "\x1f".join(item.get("keywords", []))):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def make_source(item):
+    return {
+        "id": item["id"],
+        "url": item.get("url", ""),
+        "title": item.get("title", ""),
+        "content": item.get("content", ""),
+        "keywords": item.get("keywords", []),
+        "content_hash": content_hash(item),
+        **document_features(item),
+        "suggest": suggest_inputs(item),
+    }
+
+
+def suggest_inputs(item):
+    """Заголовок, его хвосты со значимых слов и ключевые слова; свежие новости весомее"""
+    words = item.get("title", "").split()
+    inputs = [" ".join(words)] if words else []
+    tails = [i for i, word in enumerate(words) if i and len(word) >= SUGGEST_MIN_WORD]
+    inputs += [" ".join(words[i:]) for i in tails[:SUGGEST_TAIL_WORDS]]
+    inputs += [k for k in item.get("keywords", []) if k]
+    try:
+        weight = int(item["id"])
+    except (KeyError, TypeError, ValueError):
+        weight = 1
+    return {"input": list(dict.fromkeys(inputs)), "weight": weight}
+
+
+def iter_actions(index_name, json_file, skipped):
+    """Действия bulk по одному на статью; статьи читаются из корпуса потоково"""
+    for item in iter_articles(json_file):
+        # Почти-дубликаты (dup_of от дедупликации скрапера) не индексируем: они забивают топ выдачи
+        if item.get("dup_of"):
+            skipped["duplicates"] += 1
+            continue
+        yield {
             "_index": index_name,
             "_id": item["id"],
-            "_source": {
-                "id": item["id"],
-                "url": item.get("url", ""),
-                "title": item.get("title", ""),
-                "content": item.get("content", ""),
-                "keywords": item.get("keywords", []) 
-            }
+            "_source": make_source(item),
         }
-        for item in news
-    ]
 
-    helpers.bulk(es_client, actions)
-    logger.info(f"[INFO] Индексировано {len(actions)} документов")
+
+def attach_vectors(actions):
+    """Дописывает в _source плотный вектор; кодирование пачками, поток не материализуется"""
+    if not ENCODER:
+        yield from actions
+        return
+    batch = []
+    for action in actions:
+        if action.get("_op_type") == "delete":
+            yield action
+            continue
+        batch.append(action)
+        if len(batch) >= ENCODE_BATCH:
+            yield from _encode_batch(batch)
+            batch = []
+    if batch:
+        yield from _encode_batch(batch)
+
+
+def _encode_batch(batch):
+    for action, vector in zip(batch, ENCODER.encode_articles([a["_source"] for a in batch])):
+        action["_source"]["vector"] = vector
+        yield action
+
+
+def send_actions(es_client, actions, chunk_size=CHUNK_DOCS, max_chunk_bytes=CHUNK_BYTES,
+                 thread_count=BULK_THREADS, max_retries=BULK_RETRIES):
+    """
+    Пачки ограничены и числом документов, и байтами, в памяти не больше
+    thread_count пачек. Каждый поток гонит свой helpers.streaming_bulk по
+    общему потоку действий: в отличие от parallel_bulk, он повторяет
+    отклонённые с 429 документы с экспоненциальной задержкой, так что при
+    перегрузке кластера отправители сами притормаживают.
+    """
+    actions = _SharedIterator(actions)
+    stats = {"ok": 0, "failed": 0}
+    stats_lock = threading.Lock()
+    started = time.monotonic()
+    last_report = [started]
+
+    def sender():
+        for ok, info in helpers.streaming_bulk(
+                es_client, actions,
+                chunk_size=chunk_size, max_chunk_bytes=max_chunk_bytes,
+                max_retries=max_retries, initial_backoff=2, max_backoff=60,
+                raise_on_error=False, yield_ok=True):
+            # Удаление уже отсутствующего документа - не ошибка
+            if not ok and info.get("delete", {}).get("status") == 404:
+                ok = True
+            with stats_lock:
+                if ok:
+                    stats["ok"] += 1
+                else:
+                    stats["failed"] += 1
+                    if stats["failed"] <= 10:
+                        logger.error(f"[ERROR] Документ не проиндексирован: {info}")
+                now = time.monotonic()
+                if now - last_report[0] >= REPORT_EVERY:
+                    last_report[0] = now
+                    logger.info(f"[INFO] Проиндексировано {stats['ok']}, "
+                                f"{stats['ok'] / (now - started):.0f} док/с")
+
+    with ThreadPoolExecutor(max_workers=thread_count) as executor:
+        for future in [executor.submit(sender) for _ in range(thread_count)]:
+            future.result()
+
+    stats["elapsed"] = time.monotonic() - started
+    return stats
+
+
+def index_documents(es_client, index_name, json_file, **bulk_options):
+    """Потоковая загрузка всего корпуса: статьи читаются по одной, см. send_actions"""
+    if not os.path.exists(json_file):
+        logger.error(f"Файл не найден: {json_file}")
+        return 0
+
+    skipped = {"duplicates": 0}
+    stats = send_actions(es_client, attach_vectors(iter_actions(index_name, json_file, skipped)), **bulk_options)
+
+    elapsed = stats["elapsed"]
+    if skipped["duplicates"]:
+        logger.info(f"[INFO] Пропущено почти-дубликатов: {skipped['duplicates']}")
+    logger.info(f"[INFO] Индексировано {stats['ok']} документов за {elapsed:.1f} сек. "
+                f"({stats['ok'] / max(elapsed, 1e-9):.0f} док/с), ошибок: {stats['failed']}")
+    es_client.indices.refresh(index=index_name)
+    return stats["ok"]
+
+
+def fetch_hashes(es_client, index_name):
+    """id -> content_hash всех документов индекса (у старых документов хеша нет - None)"""
+    return {
+        hit["_id"]: hit.get("_source", {}).get("content_hash")
+        for hit in helpers.scan(es_client, index=index_name, size=SCAN_SIZE,
+                                query={"query": {"match_all": {}}}, _source=["content_hash"])
+    }
+
+
+def ensure_mapping(es_client, alias):
+    """
+    Дописывает в схему текущего поколения поля, появившиеся в index_settings
+    после его создания: иначе --incremental отправит их, и ES заведёт их
+    динамически (индексируемыми и с чужими типами). False, если схемы
+    несовместимы - тогда нужна полная переиндексация.
+    """
+    properties = index_settings()["mappings"]["properties"]
+    # Анализаторы (например, suggest_analyzer у подсказок) на открытом индексе не добавить
+    needed = {field[key] for field in properties.values()
+              for key in ("analyzer", "search_analyzer") if key in field}
+    for index_name, info in es_client.indices.get_settings(index=alias).items():
+        defined = info["settings"]["index"].get("analysis", {}).get("analyzer", {})
+        missing = sorted(needed - set(defined))
+        if missing:
+            logger.error(f"[ERROR] В {index_name} нет анализаторов {missing}, нужна полная индексация")
+            return False
+    try:
+        es_client.indices.put_mapping(index=alias, properties=properties)
+    except Exception as e:
+        logger.error(f"[ERROR] Схема {alias} не совпадает с текущей ({e}), нужна полная индексация")
+        return False
+    return True
+
+
+def corpus_ids(json_file):
+    """id статей корпуса, которые попадут в индекс (без почти-дубликатов); .corpus - без распаковки текстов"""
+    ids = set()
+    if json_file.endswith(".corpus"):
+        from corpus_store import CorpusStore
+        with CorpusStore(json_file) as store:
+            for item in store.scan(["id", "dup_of"]):
+                if not item["dup_of"]:
+                    ids.add(str(item["id"]))
+        return ids
+    for item in iter_articles(json_file):
+        if not item.get("dup_of"):
+            ids.add(str(item["id"]))
+    return ids
+
+
+def index_incremental(es_client, alias, json_file, allow_mass_delete=False, **bulk_options):
+    """
+    Дельта вместо полной перезаливки: отправляются только новые и изменившиеся
+    статьи (по content_hash в индексе) и удаления для пропавших из корпуса
+    или ставших почти-дубликатами. Пишет в текущее поколение через псевдоним.
+    Возвращает None, если дельту применить нельзя.
+    """
+    if not os.path.exists(json_file):
+        logger.error(f"Файл не найден: {json_file}")
+        return None
+    if not es_client.indices.exists(index=alias):
+        logger.error(f"[ERROR] Индекса {alias} нет, нужна полная индексация")
+        return None
+    if not ensure_mapping(es_client, alias):
+        return None
+
+    started = time.monotonic()
+    existing = fetch_hashes(es_client, alias)
+    counts = {"new": 0, "changed": 0, "unchanged": 0, "deleted": 0}
+
+    # Проверка на массовое удаление - до отправки чего-либо: отклонённый запуск
+    # не должен оставить в живом индексе половину дельты
+    seen = corpus_ids(json_file)
+    deletes = [doc_id for doc_id in existing if doc_id not in seen]
+    if existing and len(deletes) > len(existing) * MAX_DELETE_RATIO and not allow_mass_delete:
+        # Скорее всего передан неполный корпус (например, только свежий JSONL)
+        logger.error(f"[ERROR] К удалению {len(deletes)} из {len(existing)} документов - "
+                     f"больше {MAX_DELETE_RATIO:.0%}, изменения не применены (см. --allow-mass-delete)")
+        return None
+
+    def upserts():
+        # Генератор, а не список: при первом запуске без хешей изменившимся окажется весь корпус
+        for item in iter_articles(json_file):
+            doc_id = str(item["id"])
+            if item.get("dup_of"):
+                continue
+            source = make_source(item)
+            if existing.get(doc_id) == source["content_hash"]:
+                counts["unchanged"] += 1
+                continue
+            counts["new" if doc_id not in existing else "changed"] += 1
+            yield {"_index": alias, "_id": doc_id, "_source": source}
+
+    stats = send_actions(es_client, attach_vectors(upserts()), **bulk_options)
+
+    if deletes:
+        counts["deleted"] = len(deletes)
+        deleted = send_actions(es_client, ({"_op_type": "delete", "_index": alias, "_id": doc_id}
+                                           for doc_id in deletes), **bulk_options)
+        stats["failed"] += deleted["failed"]
+
+    es_client.indices.refresh(index=alias)
+    logger.info(f"[INFO] Инкрементальная индексация за {time.monotonic() - started:.1f} сек.: {counts}, "
+                f"ошибок: {stats['failed']}")
+    return counts
+
+
+@contextmanager
+def phase(name, timings):
+    started = time.monotonic()
+    yield
+    timings[name] = round(time.monotonic() - started, 2)
+    logger.info(f"[INFO] {name}: {timings[name]} сек.")
+
+
+def get_index_settings(es_client, index_name, keys):
+    """Текущие значения настроек (None - не заданы явно, действует значение по умолчанию)"""
+    flat = es_client.indices.get_settings(index=index_name, flat_settings=True)[index_name]["settings"]
+    return {key: flat.get(f"index.{key}") for key in keys}
+
+
+def warm_index(es_client, index_name):
+    """Прогрев после слияния: поднимаем в кэш сегменты, нормы и глобальные ординалы keywords"""
+    for query in WARM_QUERIES:
+        es_client.search(index=index_name, size=10, query={
+            "multi_match": {"query": query, "fields": ["title^2", "content"]}
+        })
+    es_client.search(index=index_name, size=0, aggs={
+        "keywords": {"terms": {"field": "keywords", "size": 50}}
+    })
+    # FST автодополнения грузится в память при первом обращении
+    es_client.search(index=index_name, source=False, suggest={
+        "warm": {"prefix": WARM_QUERIES[0], "completion": {"field": "suggest"}}
+    })
+
+
+def bulk_load(es_client, index_name, json_file, async_translog=False, max_segments=1, warm=True):
+    """
+    Массовая загрузка: на время заливки отключаются refresh и реплики (и, по
+    желанию, синхронный translog), затем прежние настройки возвращаются,
+    индекс сливается до max_segments сегментов и прогревается.
+    """
+    timings = {}
+    tuned = dict(BULK_LOAD_SETTINGS)
+    if async_translog:
+        tuned.update(ASYNC_TRANSLOG_SETTINGS)
+    serving = get_index_settings(es_client, index_name, tuned)
+
+    with phase("Подготовка", timings):
+        es_client.indices.put_settings(index=index_name, settings={"index": tuned})
+    try:
+        with phase("Заливка", timings):
+            count = index_documents(es_client, index_name, json_file)
+    finally:
+        # Настройки возвращаем и при упавшей заливке, иначе индекс останется без refresh
+        with phase("Восстановление настроек", timings):
+            es_client.indices.put_settings(index=index_name, settings={"index": serving})
+            es_client.indices.refresh(index=index_name)
+
+    if max_segments:
+        with phase("Слияние сегментов", timings):
+            es_client.options(request_timeout=FORCE_MERGE_TIMEOUT).indices.forcemerge(
+                index=index_name, max_num_segments=max_segments)
+    if warm:
+        with phase("Прогрев", timings):
+            warm_index(es_client, index_name)
+
+    logger.info(f"[INFO] Массовая загрузка {count} документов: {timings}")
+    return count
+
+
+def generation_name(alias):
+    # Секунд мало: два запуска подряд получили бы одно имя, а create_index удалил бы чужое поколение.
+    # Время в UTC: поколения упорядочиваются по имени, и перевод часов не должен менять порядок
+    now = time.time()
+    millis = int(now * 1000) % 1000
+    return f"{alias}-{time.strftime(GENERATION_FORMAT, time.gmtime(now))}-{millis:03d}{secrets.token_hex(2)}"
+
+
+def list_generations(es_client, alias):
+    """Физические индексы-поколения псевдонима, от старых к новым"""
+    pattern = re.compile(re.escape(alias) + GENERATION_RE)
+    names = es_client.indices.get(index=f"{alias}-*", expand_wildcards="open").keys()
+    return sorted(name for name in names if pattern.fullmatch(name))
+
+
+def alias_targets(es_client, alias):
+    if not es_client.indices.exists_alias(name=alias):
+        return []
+    return list(es_client.indices.get_alias(name=alias).keys())
+
+
+def validate_generation(es_client, index_name, expected, previous=None):
+    """Проверка перед переключением: число документов и дымовые запросы; возвращает список проблем"""
     es_client.indices.refresh(index=index_name)
+    problems = []
+    count = es_client.count(index=index_name)["count"]
+    if count < expected:
+        problems.append(f"в индексе {count} документов, отправлено {expected}")
+    if previous:
+        previous_count = es_client.count(index=previous)["count"]
+        if count < previous_count * MIN_COUNT_RATIO:
+            problems.append(f"документов {count}, а в текущем поколении {previous_count}")
+    for query in SMOKE_QUERIES:
+        res = es_client.search(index=index_name, size=1, query={
+            "multi_match": {"query": query, "fields": ["title^2", "content"]}
+        })
+        if not res["hits"]["hits"]:
+            problems.append(f"пустая выдача по запросу '{query}'")
+    return problems
+
+
+def swap_alias(es_client, alias, index_name):
+    """Атомарно перевешивает псевдоним на новое поколение"""
+    actions = [{"remove": {"index": old, "alias": alias}} for old in alias_targets(es_client, alias)]
+    if es_client.indices.exists(index=alias) and not es_client.indices.exists_alias(name=alias):
+        # Старая схема: физический индекс с именем псевдонима удаляется в той же операции
+        actions.append({"remove_index": {"index": alias}})
+    actions.append({"add": {"index": index_name, "alias": alias}})
+    es_client.indices.update_aliases(actions=actions)
+    logger.info(f"[INFO] Псевдоним {alias} -> {index_name}")
+
+
+def collect_garbage(es_client, alias, keep=KEEP_GENERATIONS):
+    """Удаляет старые поколения, оставляя keep последних (предыдущее - для отката)"""
+    current = set(alias_targets(es_client, alias))
+    generations = list_generations(es_client, alias)
+    for old in generations[:max(0, len(generations) - keep)]:
+        if old in current:
+            continue
+        es_client.indices.delete(index=old)
+        logger.info(f"[INFO] Удалено старое поколение {old}")
+
+
+def reindex_blue_green(es_client, alias, json_file, bulk=False, keep=KEEP_GENERATIONS, **bulk_options):
+    """
+    Переиндексация без простоя: корпус заливается в новое поколение, пока
+    поиск работает со старым через псевдоним; после проверки псевдоним
+    переключается одной операцией, а лишние поколения удаляются.
+    """
+    index_name = generation_name(alias)
+    previous = alias_targets(es_client, alias)
+    if not previous and es_client.indices.exists(index=alias):
+        previous = [alias]
 
+    create_index(es_client, index_name)
+    try:
+        if bulk:
+            count = bulk_load(es_client, index_name, json_file, **bulk_options)
+        else:
+            count = index_documents(es_client, index_name, json_file)
+    except Exception:
+        # Недолитое поколение не должно вытеснить при сборке мусора поколение для отката
+        es_client.indices.delete(index=index_name)
+        raise
+
+    problems = validate_generation(es_client, index_name, count, previous[0] if previous else None)
+    if problems:
+        for problem in problems:
+            logger.error(f"[ERROR] Поколение {index_name} не прошло проверку: {problem}")
+        es_client.indices.delete(index=index_name)
+        return None
+
+    swap_alias(es_client, alias, index_name)
+    collect_garbage(es_client, alias, keep=keep)
+    return index_name
+
+
+def measure_synonym_modes(es_client, json_file):
+    """Размер индекса и время заливки: синонимы при индексации против synonym_graph при поиске"""
+    results = {}
+    for mode, index_time in (("index_time", True), ("search_time", False)):
+        index_name = f"{SCRATCH_PREFIX}-{mode.replace('_', '')}"
+        create_index(es_client, index_name, index_time_synonyms=index_time)
+        started = time.monotonic()
+        count = index_documents(es_client, index_name, json_file)
+        took = time.monotonic() - started
+        es_client.options(request_timeout=FORCE_MERGE_TIMEOUT).indices.forcemerge(
+            index=index_name, max_num_segments=1)
+        stats = es_client.indices.stats(index=index_name, metric="store")
+        size = stats["indices"][index_name]["primaries"]["store"]["size_in_bytes"]
+        results[mode] = {"docs": count, "seconds": round(took, 2), "size_mb": round(size / 2 ** 20, 2)}
+        es_client.indices.delete(index=index_name)
+
+    before, after = results["index_time"], results["search_time"]
+    logger.info(f"[INFO] Синонимы при индексации: {before}")
+    logger.info(f"[INFO] Синонимы при поиске:     {after}")
+    if before["size_mb"] and before["seconds"]:
+        logger.info(f"[INFO] Размер индекса: -{(1 - after['size_mb'] / before['size_mb']):.1%}, "
+                    f"время заливки: -{(1 - after['seconds'] / before['seconds']):.1%}")
+    return results
 
 
 def main():
-    create_index(es, INDEX_NAME)
-    index_documents(es, INDEX_NAME, JSON_FILE)
+    arg_parser = argparse.ArgumentParser(description="Индексация корпуса opennet в Elasticsearch")
+    arg_parser.add_argument("corpus", nargs="?", default=JSON_FILE,
+                            help="opennet_news.json, JSONL или .corpus")
+    arg_parser.add_argument("--bulk-load", action="store_true",
+                            help="на время заливки отключить refresh и реплики, затем слить сегменты и прогреть индекс")
+    arg_parser.add_argument("--async-translog", action="store_true",
+                            help="в режиме --bulk-load писать translog асинхронно")
+    arg_parser.add_argument("--max-segments", type=int, default=1,
+                            help="до скольких сегментов сливать индекс после --bulk-load (0 - не сливать)")
+    arg_parser.add_argument("--no-warm", action="store_true",
+                            help="не прогревать индекс после --bulk-load")
+    arg_parser.add_argument("--incremental", action="store_true",
+                            help="отправить только новые/изменённые статьи и удаления в текущее поколение")
+    arg_parser.add_argument("--allow-mass-delete", action="store_true",
+                            help="в режиме --incremental разрешить удалить больше 10%% документов")
+    arg_parser.add_argument("--reload-synonyms", action="store_true",
+                            help="залить synonyms.txt в набор синонимов и перезагрузить поисковые анализаторы, без переиндексации")
+    arg_parser.add_argument("--measure-synonyms", action="store_true",
+                            help="сравнить размер индекса и время заливки при синонимах на индексации и на поиске")
+    arg_parser.add_argument("--keep", type=int, default=KEEP_GENERATIONS,
+                            help="сколько поколений индекса хранить (текущее + предыдущие для отката)")
+    arg_parser.add_argument("--build-speller", action="store_true",
+                            help="после индексации пересобрать словарь локального спеллера из индекса")
+    args = arg_parser.parse_args()
+
+    if args.reload_synonyms:
+        sync_synonyms(es)
+        return
+    if args.measure_synonyms:
+        measure_synonym_modes(es, args.corpus)
+        return
+
+    if args.incremental:
+        if index_incremental(es, INDEX_NAME, args.corpus, allow_mass_delete=args.allow_mass_delete) is None:
+            sys.exit(1)
+    else:
+        bulk_options = {}
+        if args.bulk_load:
+            bulk_options = dict(async_translog=args.async_translog,
+                                max_segments=args.max_segments, warm=not args.no_warm)
+        if reindex_blue_green(es, INDEX_NAME, args.corpus, bulk=args.bulk_load,
+                              keep=max(1, args.keep), **bulk_options) is None:
+            sys.exit(1)
+
+    if args.build_speller:
+        build_speller(scan_index(INDEX_NAME, ES_HOST))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,151 @@
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Кэш выдачи search(): LRU + TTL в процессе, по желанию поверх общего Redis.
+# В ключ входит версия данных (поколение индекса за псевдонимом, версии моделей):
+# после переключения псевдонима или смены модели старые записи больше не находятся.
+QUERY_CACHE_SIZE = 1000
+QUERY_CACHE_TTL = 300
+# Версию (запрос к ES за псевдонимом) проверяем не на каждый поиск
+VERSION_CHECK_INTERVAL = 5.0
+REDIS_PREFIX = "opennet:search:"
+
+
+def normalize_query(query):
+    # Только регистр и пробелы: "ё" и "е" спеллер и анализаторы различают, выдача может разойтись
+    return " ".join(query.lower().split())
+
+
+class RedisBackend:
+    """Общий кэш для нескольких процессов поиска; записи живут ttl секунд на стороне Redis"""
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError("Для кэша в Redis нужен пакет redis")
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._client.get(REDIS_PREFIX + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self._client.setex(REDIS_PREFIX + key, ttl, json.dumps(value, ensure_ascii=False))
+
+
+class QueryCache:
+    """
+    version_func() возвращает текущую версию данных (любой JSON-совместимый
+    объект); при её смене локальные записи сбрасываются. Инкрементальная
+    дозаливка в то же поколение версию не меняет - её покрывает TTL.
+    Записи хранятся сериализованными, как в Redis: каждый get() отдаёт свою
+    копию, и правка выдачи вызывающим (например, полей ранжировщика) кэш не портит.
+    """
+
+    def __init__(self, version_func=None, max_entries=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL,
+                 backend=None, check_interval=VERSION_CHECK_INTERVAL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self.enabled = True
+        self._version_func = version_func
+        self._check_interval = check_interval
+        self._version = None
+        self._checked = 0.0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "remote_hits": 0, "misses": 0, "evictions": 0,
+                       "expirations": 0, "invalidations": 0, "errors": 0}
+
+    def version(self):
+        now = time.monotonic()
+        if self._version_func is not None and now - self._checked >= self._check_interval:
+            version = self._version_func()
+            with self._lock:
+                if self._version is not None and version != self._version:
+                    self._stats["invalidations"] += 1
+                    self._entries.clear()
+                self._version = version
+                self._checked = now
+        return self._version
+
+    def key(self, query, *params):
+        raw = json.dumps([self.version(), normalize_query(query), *params], ensure_ascii=False)
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, raw = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return json.loads(raw)
+                del self._entries[key]
+                self._stats["expirations"] += 1
+        if self.backend is not None:
+            try:
+                value = self.backend.get(key)
+            except Exception as e:
+                value = None
+                self._error(e)
+            if value is not None:
+                self._store(key, json.dumps(value, ensure_ascii=False))
+                with self._lock:
+                    self._stats["remote_hits"] += 1
+                return value
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, key, value):
+        self._store(key, json.dumps(value, ensure_ascii=False))
+        if self.backend is not None:
+            try:
+                self.backend.set(key, value, self.ttl)
+            except Exception as e:
+                self._error(e)
+
+    def _error(self, e):
+        with self._lock:
+            self._stats["errors"] += 1
+        print(f"[WARN] Внешний кэш недоступен: {e}")
+
+    def _store(self, key, raw):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, raw)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def cached(self, compute, query, *params):
+        """Значение из кэша или compute() с сохранением результата"""
+        if not self.enabled:
+            return compute()
+        key = self.key(query, *params)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), version=self._version)
+        lookups = stats["hits"] + stats["remote_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["hits"] + stats["remote_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -1,70 +1,78 @@
+import hashlib
 import joblib
 import pandas as pd
 
+from doc_features import DOC_FEATURES, document_features
+
 class relevance_ranker:
     def __init__(self, model_path='./ml/relevance_classifier.pkl'):
 
         self.model = joblib.load(model_path)
+        with open(model_path, 'rb') as f:
+            # Версия модели: входит в ключ кэша выдачи
+            self.version = hashlib.blake2b(f.read(), digest_size=8).hexdigest()
 
-    def prepare_article_data(self, query_text, article_data):
-        title = article_data.get('title', '')
-        content = article_data.get('content', '')
-        keywords = ', '.join(article_data.get('keywords', [])) if isinstance(article_data.get('keywords'), list) else article_data.get('keywords', '')
-
-        df = pd.DataFrame([{
-            'query': query_text,
-            'title': title,
-            'keywords': keywords,
-            'content': content
-        }])
-
-        df['content_short'] = df['content'].apply(lambda x: '. '.join(str(x).split('.')[:2]).strip() + '.')
-        df['query_title'] = df['query'] + ' ' + df['title']
-        df['query_keywords'] = df['query'] + ' ' + df['keywords']
-        df['query_content'] = df['query'] + ' ' + df['content_short']
-        df['title_len'] = df['title'].str.len()
-        df['keywords_count'] = df['keywords'].str.count(',') + 1
-        df['content_len'] = df['content_short'].str.len()
+    def prepare_features(self, query_text, articles):
+        """Признаки для пачки документов: готовые берутся из _source, запросные считаются здесь"""
+        rows = []
+        for article in articles:
+            # Документы из индекса до появления признаков - считаем на лету
+            features = article if all(k in article for k in DOC_FEATURES) else document_features(article)
+            rows.append({
+                'title': article.get('title', ''),
+                'keywords': features['keywords_str'],
+                'content_short': features['content_short'],
+                'title_len': features['title_len'],
+                'keywords_count': features['keywords_count'],
+                'content_len': features['content_len'],
+            })
+
+        df = pd.DataFrame(rows)
+        df['query'] = query_text
+        df['query_title'] = query_text + ' ' + df['title']
+        df['query_keywords'] = query_text + ' ' + df['keywords']
+        df['query_content'] = query_text + ' ' + df['content_short']
         return df
 
-    def calculate_ml_score(self, query_text, article_data):
+    def prepare_article_data(self, query_text, article_data):
+        return self.prepare_features(query_text, [article_data])
+
+    def predict(self, query_text, articles):
+        text_features = ['query_title', 'query_keywords', 'query_content']
+        numeric_features = ['title_len', 'keywords_count', 'content_len']
         try:
-            df = self.prepare_article_data(query_text, article_data)
-            text_features = ['query_title', 'query_keywords', 'query_content']
-            numeric_features = ['title_len', 'keywords_count', 'content_len']
+            df = self.prepare_features(query_text, articles)
             X = df[text_features + numeric_features]
-            ml_score = self.model.predict_proba(X)[0, 1]
-            return float(ml_score)
+            return [float(p) for p in self.model.predict_proba(X)[:, 1]]
         except Exception as e:
             print(f"[ERROR] ML-ранжирование: {e}")
-            return 0.0
+            return [0.0] * len(articles)
+
+    def calculate_ml_score(self, query_text, article_data):
+        return self.predict(query_text, [article_data])[0]
 
     def rerank_results(self, query_text, es_results, ml_weight=0.65, es_weight=0.35):
         if not es_results or 'hits' not in es_results:
             return es_results
 
         hits = es_results['hits']['hits']
+        if not hits:
+            return es_results
         es_scores = [hit['_score'] for hit in hits]
         max_es_score = max(es_scores) if es_scores else 1
         min_es_score = min(es_scores) if es_scores else 0
-        
-        enhanced_results = []
 
-        for i, hit in enumerate(hits):
-            article_data = {
-                'title': hit['_source'].get('title', ''),
-                'content': hit['_source'].get('content', ''),
-                'keywords': hit['_source'].get('keywords', []),
-                '_score': hit['_score']
-            }
+        # Одна модель на всю выдачу вместо вызова на каждый документ
+        ml_scores = self.predict(query_text, [hit['_source'] for hit in hits])
 
-            ml_score = self.calculate_ml_score(query_text, article_data)
-            
+        enhanced_results = []
+
+        for hit, ml_score in zip(hits, ml_scores):
             if max_es_score > min_es_score:
                 es_score_normalized = (hit['_score'] - min_es_score) / (max_es_score - min_es_score)
             else:
                 es_score_normalized = 1.0
-                
+
             combined_score = ml_weight * ml_score + es_weight * es_score_normalized
 
             enhanced_results.append({
@@ -1,6 +1,10 @@
-import requests
+import time
+import argparse
 from elasticsearch import Elasticsearch
 from ranker import relevance_ranker 
+from speller import HTTP_SPELLER_FALLBACK, http_correct, load_speller
+from vectors import load_encoder
+from query_cache import QueryCache, RedisBackend
 import pprint
 
 ES_HOST = "http://localhost:9200"
@@ -14,39 +18,33 @@ print(f"[INFO] Подключено к Elasticsearch: {ES_HOST}, индекс: {
 
 
 ranker = relevance_ranker(model_path='./llm/relevance_classifier.pkl')
+# Локальный словарь (python speller.py); без него - Яндекс.Спеллер по HTTP
+speller = load_speller()
+
+# Гибридный режим: kNN по LSA-векторам (vectors.py) + BM25, слияние RRF
+encoder = load_encoder()
+RRF_K = 60
+RRF_WINDOW = 50
+KNN_CANDIDATES = 100
+# Автодополнение по completion-полю suggest (index.py): без спеллера, ранжировщика и _source-текстов
+SUGGEST_SIZE = 7
+SUGGEST_MIN_CHARS = 2
+LATENCY_QUERIES = ["ssh ключи", "vulkan драйвер", "прошивки bios", "видеокарта nvidia",
+                   "программирование rust", "apache сервер", "linux wine", "процессоры intel"]
 
 def correct_spelling(text: str) -> str:
-    url = "https://speller.yandex.net/services/spellservice.json/checkText"
-    params = {"text": text, "lang": "ru,en"}
-    try:
-        resp = requests.get(url, params=params, timeout=5)
-        resp.raise_for_status()
-        corrections = resp.json()
-        if not corrections:
-            return text
-        for corr in reversed(corrections):
-            word = text[corr['pos']:corr['pos']+corr['len']]
-            suggestion = corr['s'][0] if corr.get('s') else word
-            text = text[:corr['pos']] + suggestion + text[corr['pos']+corr['len']:]
-        return text
-    except Exception as e:
-        print(f"[WARN] Не удалось исправить опечатки: {e}")
-        return text
-
-def search(query: str, size: int = 10, ml_weight=0.7, es_weight=0.3):
-    """Поиск с ранжированием ML"""
-    corrected_query = correct_spelling(query)
-    if corrected_query != query:
-        print(f"[INFO] Исправленный запрос: {corrected_query}")
+    if speller is not None:
+        return speller.correct(text)
+    return http_correct(text) if HTTP_SPELLER_FALLBACK else text
 
-    body = {
-    "query": {
+def bm25_query(query: str) -> dict:
+    return {
         "bool": {
             "should": [
                 {
                     "match": {
                         "title": {
-                            "query": corrected_query,
+                            "query": query,
                             "boost": 4
                         }
                     }
@@ -54,7 +52,7 @@ def search(query: str, size: int = 10, ml_weight=0.7, es_weight=0.3):
                 {
                     "match": {
                         "keywords": {
-                            "query": corrected_query,
+                            "query": query,
                             "boost": 3
                         }
                     }
@@ -62,7 +60,7 @@ def search(query: str, size: int = 10, ml_weight=0.7, es_weight=0.3):
                 {
                     "match": {
                         "content": {
-                            "query": corrected_query,
+                            "query": query,
                             "boost": 1
                         }
                     }
@@ -70,7 +68,7 @@ def search(query: str, size: int = 10, ml_weight=0.7, es_weight=0.3):
                 {
                     "match_phrase": {
                         "content": {
-                            "query": corrected_query,
+                            "query": query,
                             "slop": 2,
                             "boost": 5
                         }
@@ -80,21 +78,162 @@ def search(query: str, size: int = 10, ml_weight=0.7, es_weight=0.3):
             "minimum_should_match": 1
         }
     }
-}
 
 
-    res = es.search(index=INDEX_NAME, body=body, size=size)
+def rrf_fuse(rankings, size: int, k: int = RRF_K) -> dict:
+    """Reciprocal Rank Fusion: score = сумма 1 / (k + ранг) по всем спискам"""
+    scores = {}
+    docs = {}
+    for hits in rankings:
+        for rank, hit in enumerate(hits, 1):
+            scores[hit["_id"]] = scores.get(hit["_id"], 0.0) + 1.0 / (k + rank)
+            docs.setdefault(hit["_id"], hit)
+    top = sorted(scores, key=scores.get, reverse=True)[:size]
+    return {"hits": {"hits": [{**docs[doc_id], "_score": scores[doc_id]} for doc_id in top]}}
+
+
+def retrieve(query: str, size: int = 10, mode: str = "bm25") -> dict:
+    """Выдача Elasticsearch без ранжировщика: bm25 - прежний запрос, hybrid - BM25 + kNN через RRF"""
+    if mode == "hybrid" and encoder is None:
+        print("[WARN] LSA-модель не обучена (python vectors.py), гибридный режим недоступен")
+        mode = "bm25"
+    if mode == "bm25":
+        return es.search(index=INDEX_NAME, body={"query": bm25_query(query)}, size=size)
+
+    # Слияние на клиенте: оба списка одним msearch, rank.rrf в 8.11 - технологическое превью
+    window = max(size, RRF_WINDOW)
+    vector = encoder.encode([query])[0]
+    responses = es.msearch(searches=[
+        {"index": INDEX_NAME},
+        {"query": bm25_query(query), "size": window},
+        {"index": INDEX_NAME},
+        {"knn": {"field": "vector", "query_vector": vector, "k": window,
+                 "num_candidates": max(KNN_CANDIDATES, window)},
+         "size": window},
+    ])["responses"]
+    bm25, knn = responses
+    if "error" in bm25:
+        raise RuntimeError(f"BM25-запрос не выполнен: {bm25['error']}")
+    if "error" in knn:
+        # Например, в поколении нет поля vector или у него другая размерность
+        error = knn["error"]
+        reason = error.get("reason", error) if isinstance(error, dict) else error
+        print(f"[WARN] kNN-запрос не выполнен ({reason}), выдача только по BM25")
+        return {"hits": {"hits": bm25["hits"]["hits"][:size]}}
+    return rrf_fuse([bm25["hits"]["hits"], knn["hits"]["hits"]], size)
+
+
+def data_version():
+    """Поколение индекса за псевдонимом и версии моделей и словаря спеллера: при их смене кэш выдачи сбрасывается"""
+    if es.indices.exists_alias(name=INDEX_NAME):
+        generation = sorted(es.indices.get_alias(name=INDEX_NAME))
+    else:
+        generation = [INDEX_NAME]
+    return [generation, ranker.version, encoder.fingerprint if encoder is not None else None,
+            speller.fingerprint if speller is not None else None]
+
+
+query_cache = QueryCache(data_version)
+
+
+def search(query: str, size: int = 10, ml_weight=0.7, es_weight=0.3, mode: str = "bm25"):
+    """Поиск с ранжированием ML; повторные запросы отдаются из кэша выдачи"""
+    return query_cache.cached(lambda: search_uncached(query, size, ml_weight, es_weight, mode),
+                              query, size, ml_weight, es_weight, mode)
+
+
+def search_uncached(query: str, size: int = 10, ml_weight=0.7, es_weight=0.3, mode: str = "bm25"):
+    corrected_query = correct_spelling(query)
+    if corrected_query != query:
+        print(f"[INFO] Исправленный запрос: {corrected_query}")
+
+    res = retrieve(corrected_query, size=size, mode=mode)
     enhanced_res = ranker.rerank_results(corrected_query, res, ml_weight=ml_weight, es_weight=es_weight)
     hits = enhanced_res.get("hits", {}).get("hits", [])
     return hits
 
+
+def suggest(prefix: str, size: int = SUGGEST_SIZE, fuzzy: bool = False) -> list:
+    """Подсказки для набираемого запроса: [{"text", "title", "url"}], свежие новости выше"""
+    prefix = " ".join(prefix.lower().split())
+    if len(prefix) < SUGGEST_MIN_CHARS:
+        return []
+    completion = {"field": "suggest", "size": size, "skip_duplicates": True}
+    if fuzzy:
+        # Терпит опечатку, но заметно медленнее - не для каждого нажатия
+        completion["fuzzy"] = {"fuzziness": "AUTO", "min_length": 4}
+    res = es.search(
+        index=INDEX_NAME,
+        suggest={"titles": {"prefix": prefix, "completion": completion}},
+        source=["title", "url"],
+        filter_path="suggest.titles.options.text,suggest.titles.options._source",
+    )
+    options = res.get("suggest", {}).get("titles", [{}])[0].get("options", [])
+    return [
+        {"text": o["text"], "title": o.get("_source", {}).get("title", ""), "url": o.get("_source", {}).get("url", "")}
+        for o in options
+    ]
+
+
+def compare_latency(queries, size: int = 10, repeats: int = 5):
+    """Задержка выдачи (без спеллера) и выдачи с ранжировщиком: прежний запрос против гибридного"""
+    modes = ["bm25", "hybrid"] if encoder is not None else ["bm25"]
+    for mode in modes:
+        retrieval, total = [], []
+        for _ in range(repeats):
+            for query in queries:
+                started = time.perf_counter()
+                res = retrieve(query, size=size, mode=mode)
+                retrieved = time.perf_counter()
+                ranker.rerank_results(query, res)
+                retrieval.append((retrieved - started) * 1000)
+                total.append((time.perf_counter() - started) * 1000)
+        for name, values in (("выдача", retrieval), ("выдача+ML", total)):
+            values.sort()
+            print(f"[LATENCY] {mode:6s} {name:10s} p50 {values[len(values) // 2]:7.1f} мс, "
+                  f"p95 {values[int(len(values) * 0.95) - 1]:7.1f} мс")
+
+
 if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Поиск по новостям opennet")
+    arg_parser.add_argument("--mode", choices=["bm25", "hybrid"], default="bm25",
+                            help="hybrid - BM25 + kNN по плотным векторам с RRF")
+    arg_parser.add_argument("--latency", action="store_true",
+                            help="сравнить задержку bm25 и hybrid на наборе запросов и выйти")
+    arg_parser.add_argument("--suggest", action="store_true",
+                            help="режим автодополнения: подсказки и время ответа на каждый ввод")
+    arg_parser.add_argument("--no-cache", action="store_true", help="не кэшировать выдачу")
+    arg_parser.add_argument("--cache-redis", metavar="URL",
+                            help="общий кэш выдачи в Redis, например redis://localhost:6379/0")
+    args = arg_parser.parse_args()
+    query_cache.enabled = not args.no_cache
+    if args.cache_redis:
+        query_cache.backend = RedisBackend(args.cache_redis)
+
+    if args.latency:
+        compare_latency(LATENCY_QUERIES)
+        raise SystemExit
+
+    if args.suggest:
+        print("Введите начало запроса (или 'exit' для выхода):")
+        while True:
+            prefix = input("> ").strip()
+            if prefix.lower() in ["exit", "quit"]:
+                break
+            started = time.perf_counter()
+            suggestions = suggest(prefix)
+            print(f"[INFO] {len(suggestions)} подсказок за {(time.perf_counter() - started) * 1000:.1f} мс")
+            for s in suggestions:
+                print(f"   {s['text']}  ->  {s['url']}")
+        raise SystemExit
+
     print("Введите поисковый запрос (или 'exit' для выхода):")
     while True:
         query = input("> ").strip()
         if query.lower() in ["exit", "quit"]:
             break
 
+        started = time.perf_counter()
         size = 10
         if "," in query:
             try:
@@ -104,12 +243,13 @@ if __name__ == "__main__":
                 size = 10
             query = query.strip()
 
-        results = search(query, size=size)
+        results = search(query, size=size, mode=args.mode)
+        elapsed = (time.perf_counter() - started) * 1000
         if not results:
             print("[INFO] Результатов не найдено.")
             continue
 
-        print(f"[INFO] Найдено {len(results)} результатов:\n")
+        print(f"[INFO] Найдено {len(results)} результатов за {elapsed:.1f} мс:\n")
         for i, hit in enumerate(results, 1):
             source = hit["_source"]
             title = source.get("title", "")
@@ -128,3 +268,7 @@ if __name__ == "__main__":
                 f"   [Content]: {content[:500]}{'...' if len(content) > 500 else ''}\n"
                 f"   [ML Score]: {ml_score:.3f}, [Combined Score]: {combined_score:.3f}\n"
             )
+
+    stats = query_cache.stats()
+    print(f"[CACHE] попаданий {stats['hits']} (+{stats['remote_hits']} из Redis), промахов {stats['misses']}, "
+          f"вытеснено {stats['evictions']}, истекло {stats['expirations']}, сбросов {stats['invalidations']}")
@@ -1,8 +1,8 @@
 import json
 import pandas as pd
-import requests
 from elasticsearch import Elasticsearch
 from ranker import relevance_ranker
+from speller import HTTP_SPELLER_FALLBACK, http_correct, load_speller
 
 ES_HOST = "http://localhost:9200"
 INDEX_NAME = "opennet_news"
@@ -14,21 +14,13 @@ if not es.ping():
 print(f"[INFO] Подключено к Elasticsearch: {ES_HOST}, индекс: {INDEX_NAME}")
 
 ranker = relevance_ranker(model_path='./llm/relevance_classifier.pkl')
+# Локальный словарь (python speller.py); без него - Яндекс.Спеллер по HTTP
+speller = load_speller()
 
 def correct_spelling(text: str) -> str:
-    url = "https://speller.yandex.net/services/spellservice.json/checkText"
-    params = {"text": text, "lang": "ru,en"}
-    try:
-        resp = requests.get(url, params=params, timeout=5)
-        resp.raise_for_status()
-        corrections = resp.json()
-        for corr in reversed(corrections):
-            word = text[corr['pos']:corr['pos']+corr['len']]
-            suggestion = corr['s'][0] if corr.get('s') else word
-            text = text[:corr['pos']] + suggestion + text[corr['pos']+corr['len']:]
-        return text
-    except:
-        return text
+    if speller is not None:
+        return speller.correct(text)
+    return http_correct(text) if HTTP_SPELLER_FALLBACK else text
 
 def search(query: str, size: int = 10, ml_weight=0.7, es_weight=0.3):
     corrected_query = correct_spelling(query)
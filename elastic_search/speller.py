@@ -0,0 +1,322 @@
+import os
+import re
+import sys
+import mmap
+import time
+import zlib
+import struct
+import argparse
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+import requests
+from elasticsearch import Elasticsearch, helpers
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from corpus_io import iter_articles
+
+# Локальный спеллер в духе SymSpell: для каждого слова словаря заранее
+# перечислены все варианты с удалёнными символами (до MAX_DISTANCE), запрос
+# сводится к тем же удалениям и поиску по таблице - без перебора словаря.
+# Словарь - поверхностные формы слов из opennet_news и списка синонимов.
+SPELLER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm", "speller.bin")
+SYNONYMS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "synonyms.txt")
+ES_HOST = "http://localhost:9200"
+INDEX_NAME = "opennet_news"
+SCAN_SIZE = 2000
+
+MAX_DISTANCE = 2
+# Удаления считаются только по началу слова: таблица в разы меньше, точность почти та же
+PREFIX_LENGTH = 7
+MIN_WORD_LEN = 3
+# Слова реже MIN_COUNT - сами чаще всего опечатки
+MIN_COUNT = 3
+MAX_WORDS = 300000
+# Слова из синонимов считаются известными, даже если в корпусе редки
+SYNONYM_COUNT = 1000
+# Слово, встречавшееся в корпусе, исправляется, только если кандидат во столько раз
+# частотнее (как count ratio в SymSpell): иначе редкие, но верные формы ("ядро" -> "ядра")
+# подменяются соседними частотными. Опечатки запросов в корпусе почти не встречаются
+# и исправляются как прежде.
+CORRECTION_RATIO = 1000
+# Редкие слова (ниже MIN_COUNT или за MAX_WORDS) хранятся только с частотами - для этого сравнения
+MAX_RARE_WORDS = 500000
+# Исправления отдельных слов запоминаются: популярные запросы повторяются
+CACHE_WORDS = 50000
+# Яндекс.Спеллер - только если локальный словарь ещё не собран
+HTTP_SPELLER_FALLBACK = True
+HTTP_SPELLER_URL = "https://speller.yandex.net/services/spellservice.json/checkText"
+
+# Формат файла: MAGIC, заголовок, частоты слов (uint32), слова через \n, частоты и
+# отсортированный список редких слов, выравнивание до 8 байт и отсортированная таблица
+# удалений: uint64 = crc32(удаление) << 32 | номер слова. В OPNSPEL1 редких слов нет.
+MAGIC = b"OPNSPEL2"
+_HEADER = struct.Struct("<BBIIIII")
+MAGIC_V1 = b"OPNSPEL1"
+_HEADER_V1 = struct.Struct("<BBIII")
+WORD_RE = re.compile(r"[^\W\d_]+")
+
+
+def _normalize(word):
+    return word.lower().replace("ё", "е")
+
+
+def _deletes(word, max_distance, prefix_length):
+    """Само слово (по префиксу) и все варианты с 1..max_distance удалёнными символами"""
+    word = word[:prefix_length]
+    found = {word}
+    level = [word]
+    for _ in range(max_distance):
+        following = []
+        for item in level:
+            if len(item) <= 1:
+                continue
+            for i in range(len(item)):
+                variant = item[:i] + item[i + 1:]
+                if variant not in found:
+                    found.add(variant)
+                    following.append(variant)
+        level = following
+    return found
+
+
+def edit_distance(a, b, limit):
+    """Дамерау-Левенштейн (с перестановкой соседних букв); больше limit - сразу limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    # Общие начало и конец не влияют на расстояние, а у словоформ они длинные
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+    if not a or not b:
+        return len(a) + len(b)
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def read_synonym_words(path=SYNONYMS_FILE):
+    words = set()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip() and not line.lstrip().startswith("#"):
+                    words.update(_normalize(w) for w in WORD_RE.findall(line))
+    return words
+
+
+def count_words(articles):
+    counts = Counter()
+    for article in articles:
+        keywords = article.get("keywords") or []
+        if isinstance(keywords, list):
+            keywords = " ".join(keywords)
+        for text in (article.get("title") or "", keywords, article.get("content") or ""):
+            counts.update(_normalize(w) for w in WORD_RE.findall(text))
+    return counts
+
+
+def scan_index(index=INDEX_NAME, host=ES_HOST):
+    """Тексты статей из индекса (через псевдоним - текущее поколение)"""
+    es_client = Elasticsearch(host)
+    for hit in helpers.scan(es_client, index=index, query={"query": {"match_all": {}}},
+                            _source=["title", "content", "keywords"], size=SCAN_SIZE):
+        yield hit["_source"]
+
+
+def build_speller(articles, path=SPELLER_FILE, synonyms_path=SYNONYMS_FILE,
+                  max_distance=MAX_DISTANCE, prefix_length=PREFIX_LENGTH):
+    started = time.monotonic()
+    counts = count_words(articles)
+    vocabulary = [(w, c) for w, c in counts.most_common(MAX_WORDS)
+                  if c >= MIN_COUNT and len(w) >= MIN_WORD_LEN]
+    known = {w for w, _ in vocabulary}
+    vocabulary += [(w, SYNONYM_COUNT) for w in sorted(read_synonym_words(synonyms_path))
+                   if w not in known and len(w) >= MIN_WORD_LEN]
+    known.update(w for w, _ in vocabulary)
+    rare = [(w, c) for w, c in counts.most_common() if w not in known and len(w) >= MIN_WORD_LEN]
+    rare = sorted(rare[:MAX_RARE_WORDS])
+
+    entries = array("Q")
+    for number, (word, _count) in enumerate(vocabulary):
+        for variant in _deletes(word, max_distance, prefix_length):
+            entries.append(zlib.crc32(variant.encode("utf-8")) << 32 | number)
+    entries = array("Q", sorted(entries))
+
+    words_blob = "\n".join(w for w, _ in vocabulary).encode("utf-8")
+    rare_blob = "\n".join(w for w, _ in rare).encode("utf-8")
+    header = MAGIC + _HEADER.pack(max_distance, prefix_length, len(vocabulary), len(words_blob),
+                                  len(rare), len(rare_blob), len(entries))
+    body = (array("I", [min(c, 0xFFFFFFFF) for _, c in vocabulary]).tobytes() + words_blob
+            + array("I", [min(c, 0xFFFFFFFF) for _, c in rare]).tobytes() + rare_blob)
+    padding = -(len(header) + len(body)) % 8
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(body)
+        f.write(b"\x00" * padding)
+        entries.tofile(f)
+    os.replace(tmp, path)
+    print(f"[INFO] Словарь спеллера: {len(vocabulary)} слов, {len(rare)} редких, {len(entries)} удалений, "
+          f"{os.path.getsize(path) / 1024 / 1024:.1f} МБ, {time.monotonic() - started:.1f} сек. -> {path}")
+    return len(vocabulary)
+
+
+class SpellCorrector:
+    """Исправление опечаток по словарю speller.bin; таблица удалений читается через mmap"""
+
+    def __init__(self, path=SPELLER_FILE):
+        self._file = open(path, "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic = self._data[:len(MAGIC)]
+        offset = len(MAGIC)
+        if magic == MAGIC:
+            self.max_distance, self.prefix_length, word_count, words_len, rare_count, rare_len, entry_count = \
+                _HEADER.unpack_from(self._data, offset)
+            offset += _HEADER.size
+        elif magic == MAGIC_V1:
+            # Старый словарь без редких слов: отношение частот не применяется
+            self.max_distance, self.prefix_length, word_count, words_len, entry_count = \
+                _HEADER_V1.unpack_from(self._data, offset)
+            offset += _HEADER_V1.size
+            rare_count = rare_len = 0
+        else:
+            raise ValueError(f"{path}: не словарь спеллера")
+        self.counts = array("I")
+        self.counts.frombytes(self._data[offset:offset + word_count * 4])
+        offset += word_count * 4
+        self.words = self._data[offset:offset + words_len].decode("utf-8").split("\n") if word_count else []
+        offset += words_len
+        self.rare_counts = array("I")
+        self.rare_counts.frombytes(self._data[offset:offset + rare_count * 4])
+        offset += rare_count * 4
+        self.rare_words = self._data[offset:offset + rare_len].decode("utf-8").split("\n") if rare_count else []
+        offset += rare_len
+        offset += -offset % 8
+        self._entries = memoryview(self._data)[offset:offset + entry_count * 8].cast("Q")
+        self._cache = {}
+        # Версия словаря для ключей кэша выдачи: пересборка меняет исправления
+        self.fingerprint = f"{zlib.crc32(self._data):08x}"
+
+    def _candidates(self, variant):
+        key = zlib.crc32(variant.encode("utf-8")) << 32
+        i = bisect_left(self._entries, key)
+        while i < len(self._entries) and self._entries[i] >> 32 == key >> 32:
+            yield self._entries[i] & 0xFFFFFFFF
+            i += 1
+
+    def rare_count(self, normalized):
+        """Частота слова, не попавшего в словарь; 0 - в корпусе не встречалось"""
+        i = bisect_left(self.rare_words, normalized)
+        if i < len(self.rare_words) and self.rare_words[i] == normalized:
+            return self.rare_counts[i]
+        return 0
+
+    def correct_word(self, word):
+        """
+        Ближайшее слово словаря (при равном расстоянии - частотное) или само слово.
+        Слово из корпуса меняется, только если кандидат в CORRECTION_RATIO раз частотнее.
+        """
+        normalized = _normalize(word)
+        if len(normalized) < MIN_WORD_LEN:
+            return word
+        corrected = self._cache.get(normalized)
+        if corrected is None:
+            if len(self._cache) >= CACHE_WORDS:
+                self._cache.clear()
+            corrected = self._cache[normalized] = self._lookup(normalized)
+        return word if corrected == normalized else corrected
+
+    def _lookup(self, normalized):
+        # Известное слово не исправляем; оно среди кандидатов по самому префиксу
+        if any(self.words[n] == normalized for n in self._candidates(normalized[:self.prefix_length])):
+            return normalized
+        # Короткие слова исправляем не дальше одной правки, иначе подменяется смысл
+        limit = 1 if len(normalized) <= 4 else self.max_distance
+        best, best_key = None, (limit + 1, 0)
+        seen = set()
+        for variant in sorted(_deletes(normalized, limit, self.prefix_length), key=len, reverse=True):
+            # Удалений больше, чем уже найденное расстояние - лучшего кандидата не дадут
+            if min(len(normalized), self.prefix_length) - len(variant) > best_key[0]:
+                break
+            for number in self._candidates(variant):
+                if number in seen:
+                    continue
+                seen.add(number)
+                candidate = self.words[number]
+                if abs(len(candidate) - len(normalized)) > limit:
+                    continue
+                distance = edit_distance(normalized, candidate, limit)
+                key = (distance, -self.counts[number])
+                if distance <= limit and key < best_key:
+                    best, best_key = candidate, key
+        if best is None or -best_key[1] < CORRECTION_RATIO * self.rare_count(normalized):
+            return normalized
+        return best
+
+    def correct(self, text):
+        return WORD_RE.sub(lambda m: self.correct_word(m.group(0)), text)
+
+    def close(self):
+        self._entries.release()
+        self._data.close()
+        self._file.close()
+
+
+def load_speller(path=SPELLER_FILE):
+    """None, если словарь ещё не собран (python speller.py)"""
+    return SpellCorrector(path) if os.path.exists(path) else None
+
+
+def http_correct(text: str) -> str:
+    """Яндекс.Спеллер: запасной вариант на узлах без собранного словаря"""
+    params = {"text": text, "lang": "ru,en"}
+    try:
+        resp = requests.get(HTTP_SPELLER_URL, params=params, timeout=5)
+        resp.raise_for_status()
+        corrections = resp.json()
+        for corr in reversed(corrections):
+            word = text[corr['pos']:corr['pos']+corr['len']]
+            suggestion = corr['s'][0] if corr.get('s') else word
+            text = text[:corr['pos']] + suggestion + text[corr['pos']+corr['len']:]
+        return text
+    except Exception as e:
+        print(f"[WARN] Не удалось исправить опечатки: {e}")
+        return text
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Сборка и проверка локального спеллера")
+    arg_parser.add_argument("--corpus", help="собрать словарь из файла корпуса вместо индекса")
+    arg_parser.add_argument("--index", default=INDEX_NAME)
+    arg_parser.add_argument("--out", default=SPELLER_FILE)
+    arg_parser.add_argument("--check", nargs="+", metavar="QUERY",
+                            help="исправить запросы собранным словарём и показать время")
+    args = arg_parser.parse_args()
+
+    if args.check:
+        started = time.perf_counter()
+        speller = SpellCorrector(args.out)
+        print(f"[INFO] Словарь загружен за {(time.perf_counter() - started) * 1000:.1f} мс, {len(speller.words)} слов")
+        for query in args.check:
+            started = time.perf_counter()
+            corrected = speller.correct(query)
+            print(f"[INFO] {query} -> {corrected} ({(time.perf_counter() - started) * 1e6:.0f} мкс)")
+    else:
+        build_speller(iter_articles(args.corpus) if args.corpus else scan_index(args.index), path=args.out)
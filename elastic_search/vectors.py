@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import hashlib
+import argparse
+
+import joblib
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import Normalizer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from corpus_io import iter_articles
+
+# Плотные векторы документов без внешних сервисов: TF-IDF по символьным
+# n-граммам (устойчиво к падежам и смешению русского с английским) + LSA
+VECTOR_MODEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm", "lsa_model.pkl")
+VECTOR_DIMS = 256
+# В вектор идёт начало текста: суть новости в первых абзацах, а матрица TF-IDF не раздувается
+CONTENT_CHARS = 2000
+ENCODE_BATCH = 256
+
+
+def document_text(article):
+    keywords = article.get("keywords", [])
+    if isinstance(keywords, list):
+        keywords = " ".join(keywords)
+    return f"{article.get('title', '')} {keywords} {article.get('content', '')[:CONTENT_CHARS]}"
+
+
+def build_model(corpus_path, dims=VECTOR_DIMS, path=VECTOR_MODEL_FILE):
+    texts = [document_text(a) for a in iter_articles(corpus_path) if not a.get("dup_of")]
+    started = time.monotonic()
+    model = make_pipeline(
+        TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 5), sublinear_tf=True,
+                        min_df=2, max_df=0.5, max_features=300000, dtype="float32"),
+        TruncatedSVD(n_components=dims, random_state=0),
+        Normalizer(copy=False),
+    )
+    model.fit(texts)
+    joblib.dump(model, path)
+    svd = model.named_steps["truncatedsvd"]
+    print(f"[INFO] LSA-модель: {len(texts)} документов, {dims} измерений, "
+          f"объяснённая дисперсия {svd.explained_variance_ratio_.sum():.2f}, "
+          f"{time.monotonic() - started:.1f} сек. -> {path}")
+    return model
+
+
+class VectorEncoder:
+    """Кодирует тексты обученной LSA-моделью в нормированные векторы (dot_product = косинус)"""
+
+    def __init__(self, path=VECTOR_MODEL_FILE):
+        self.model = joblib.load(path)
+        self.dims = self.model.named_steps["truncatedsvd"].n_components
+        with open(path, "rb") as f:
+            # Отпечаток модели: при переобучении векторы надо переотправить
+            self.fingerprint = hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+
+    def encode(self, texts):
+        return [[round(float(x), 6) for x in row] for row in self.model.transform(texts)]
+
+    def encode_articles(self, articles):
+        return self.encode([document_text(a) for a in articles])
+
+
+def load_encoder(path=VECTOR_MODEL_FILE):
+    """None, если модель ещё не обучена: поиск и индексация работают без векторов"""
+    return VectorEncoder(path) if os.path.exists(path) else None
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Обучение LSA-модели для плотных векторов статей")
+    arg_parser.add_argument("corpus", nargs="?",
+                            default=os.path.join(os.path.dirname(__file__), "..", "opennet_news.json"))
+    arg_parser.add_argument("--dims", type=int, default=VECTOR_DIMS)
+    arg_parser.add_argument("--out", default=VECTOR_MODEL_FILE)
+    args = arg_parser.parse_args()
+    build_model(args.corpus, dims=args.dims, path=args.out)
@@ -0,0 +1,108 @@
+import sqlite3
+import time
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+STATUS_OK = "ok"
+STATUS_MISSING = "missing"
+STATUS_ERROR = "error"
+
+
+class FetchStateStore:
+    """
+    Персистентное состояние обхода: для каждого номера статьи хранится,
+    скачана ли она (ok), отсутствует (missing, 404/пустая страница)
+    или упала с временной ошибкой (error). Повторный запуск пропускает
+    ok/missing и перезапрашивает только error и новые номера.
+    before_commit вызывается перед каждым коммитом: туда передаётся flush
+    приёмника статей, чтобы номер не стал ok раньше, чем статья попала на диск.
+    """
+
+    def __init__(self, path: str = "scrape_state.sqlite", commit_every: int = 100,
+                 before_commit: Optional[Callable[[], None]] = None):
+        self.path = path
+        self.commit_every = commit_every
+        self.before_commit = before_commit
+        self._pending_writes = 0
+        self._lock = Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fetch_state (
+                num      INTEGER PRIMARY KEY,
+                status   TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error    TEXT,
+                updated  REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def mark(self, num: int, status: str, error: Optional[str] = None):
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO fetch_state (num, status, attempts, error, updated)
+                VALUES (?, ?, 1, ?, ?)
+                ON CONFLICT(num) DO UPDATE SET
+                    status = excluded.status,
+                    attempts = fetch_state.attempts + 1,
+                    error = excluded.error,
+                    updated = excluded.updated
+                """,
+                (num, status, error, time.time()),
+            )
+            self._pending_writes += 1
+            if self._pending_writes >= self.commit_every:
+                self._commit()
+
+    def status_of(self, num: int) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status FROM fetch_state WHERE num = ?", (num,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def completed(self, retry_missing: bool = False) -> Set[int]:
+        statuses = (STATUS_OK,) if retry_missing else (STATUS_OK, STATUS_MISSING)
+        placeholders = ", ".join("?" * len(statuses))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT num FROM fetch_state WHERE status IN ({placeholders})", statuses
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def pending(self, nums: Iterable[int], retry_missing: bool = False) -> List[int]:
+        done = self.completed(retry_missing=retry_missing)
+        return [n for n in nums if n not in done]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM fetch_state GROUP BY status"
+            ).fetchall()
+        return dict(rows)
+
+    def _commit(self):
+        if self.before_commit is not None:
+            self.before_commit()
+        self._conn.commit()
+        self._pending_writes = 0
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
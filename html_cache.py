@@ -0,0 +1,108 @@
+import hashlib
+import os
+import sqlite3
+import time
+import zlib
+from threading import Lock
+from typing import Dict, Iterator, Optional, Tuple
+
+
+class HtmlCache:
+    """
+    Content-addressed кэш сырых ответов: тела страниц хранятся сжатыми
+    в objects/<xx>/<sha256>.z, а индекс url -> (hash, ETag, Last-Modified)
+    лежит в SQLite. Одинаковые тела хранятся один раз.
+    """
+
+    def __init__(self, root: str = "html_cache", level: int = 6):
+        self.root = root
+        self.level = level
+        self._lock = Lock()
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url           TEXT PRIMARY KEY,
+                hash          TEXT NOT NULL,
+                etag          TEXT,
+                last_modified TEXT,
+                content_type  TEXT,
+                fetched       REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest + ".z")
+
+    def get(self, url: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT hash, etag, last_modified, content_type FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if not row:
+            return None
+        return {"hash": row[0], "etag": row[1], "last_modified": row[2], "content_type": row[3]}
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        entry = self.get(url)
+        headers = {}
+        if entry:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def load(self, url: str) -> Optional[Tuple[bytes, Optional[str]]]:
+        """Возвращает (тело, Content-Type) из кэша или None"""
+        entry = self.get(url)
+        if not entry:
+            return None
+        try:
+            with open(self._blob_path(entry["hash"]), "rb") as f:
+                return zlib.decompress(f.read()), entry["content_type"]
+        except (OSError, zlib.error):
+            return None
+
+    def put(self, url: str, body: bytes, headers) -> str:
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{id(body)}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(zlib.compress(body, self.level))
+            os.replace(tmp, path)
+
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO pages (url, hash, etag, last_modified, content_type, fetched)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (url, digest, headers.get("ETag"), headers.get("Last-Modified"),
+                 headers.get("Content-Type"), time.time()),
+            )
+            self._conn.commit()
+        return digest
+
+    def iter_entries(self) -> Iterator[Tuple[str, bytes, Optional[str]]]:
+        """Все закэшированные страницы: (url, тело, Content-Type)"""
+        with self._lock:
+            urls = [r[0] for r in self._conn.execute("SELECT url FROM pages ORDER BY url")]
+        for url in urls:
+            cached = self.load(url)
+            if cached:
+                yield url, cached[0], cached[1]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,101 @@
+import re
+from typing import Dict, List, Optional
+
+from lxml import etree, html as lxml_html
+
+from scrape_metrics import NORMALIZE_CLOCK
+from text_normalizer import clean_text
+
+clean_text = NORMALIZE_CLOCK.track(clean_text)
+
+# Однопроходный разбор страницы на голом lxml: заголовок, текст и ключевые слова
+# достаются из одного дерева, без str(td) и повторного парсинга, как в BeautifulSoup-версии.
+
+_XML_DECL_RE = re.compile(r"^\s*<\?xml[^>]*\?>")
+
+_CHTEXT = etree.XPath(
+    "//table[contains(concat(' ', normalize-space(@class), ' '), ' ttxt2 ')]"
+    "//td[contains(concat(' ', normalize-space(@class), ' '), ' chtext ')]"
+)
+_OG_DESCRIPTION = etree.XPath("//meta[@property='og:description']/@content", smart_strings=False)
+_TITLE_SPAN = etree.XPath("//span[@id='r_title']")
+_H1 = etree.XPath("//h1")
+_H2 = etree.XPath("//h2")
+_KEYWORD_LINKS = etree.XPath("(//span[@id='r_keyword_link'])[1]//a")
+# Как и get_text() у BeautifulSoup: без комментариев, скриптов и стилей
+_TEXT_NODES = etree.XPath(
+    ".//text()[not(ancestor::script) and not(ancestor::style)]", smart_strings=False
+)
+
+
+def node_text(node, separator: str = " ") -> str:
+    """Аналог BeautifulSoup get_text(separator, strip=True)"""
+    parts = []
+    for s in _TEXT_NODES(node):
+        s = s.strip()
+        if s:
+            parts.append(s)
+    return separator.join(parts)
+
+
+def parse_tree(page_html: str):
+    if not page_html or not page_html.strip():
+        return None
+    # lxml не принимает str с XML-декларацией кодировки
+    page_html = _XML_DECL_RE.sub("", page_html, count=1)
+    try:
+        return lxml_html.document_fromstring(page_html)
+    except (etree.ParserError, ValueError):
+        return None
+
+
+def extract_article_text(tree) -> Optional[str]:
+    text = None
+    found = _CHTEXT(tree)
+    if found:
+        # Тексты узлов склеиваются через пробел, поэтому отдельный проход
+        # insert_spaces_around_tags по сырому HTML не нужен
+        text = clean_text(node_text(found[0]))
+
+    if not text or len(text) < 30:
+        content = _OG_DESCRIPTION(tree)
+        if content and content[0]:
+            text = clean_text(content[0])
+
+    return text if text and len(text) >= 30 else None
+
+
+def extract_article_title(tree, num: int) -> str:
+    for query in (_TITLE_SPAN, _H1, _H2):
+        found = query(tree)
+        if found:
+            return clean_text(node_text(found[0]))
+
+    return f"Новость {num}"
+
+
+def extract_article_keywords(tree) -> List[str]:
+    keywords = []
+    for a in _KEYWORD_LINKS(tree):
+        kw = clean_text(node_text(a, separator=""))
+        if kw:
+            keywords.append(kw)
+    return keywords
+
+
+def parse_article(num: int, url: str, page_html: str) -> Optional[Dict]:
+    tree = parse_tree(page_html)
+    if tree is None:
+        return None
+
+    text = extract_article_text(tree)
+    if not text:
+        return None
+
+    return {
+        "id": str(num),
+        "url": url,
+        "title": extract_article_title(tree, num),
+        "content": text,
+        "keywords": extract_article_keywords(tree),
+    }
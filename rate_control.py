@@ -0,0 +1,153 @@
+import asyncio
+import time
+from threading import Lock
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """Токен-бакет: не больше rate запросов в секунду с допустимым всплеском burst"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self) -> float:
+        """Забирает токен и возвращает 0 или сколько секунд ждать до следующего"""
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def set_rate(self, rate: float):
+        self._refill(time.monotonic())
+        self.rate = rate
+        self.burst = max(1.0, rate)
+        self.tokens = min(self.tokens, self.burst)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD-регулятор параллелизма и темпа запросов вместо фиксированного sleep.
+
+    Пока сервер отвечает быстро и без ошибок, лимит параллельных запросов растёт
+    примерно на 1 за "окно" (concurrency успешных ответов), а темп - примерно
+    на 1 rps в секунду. На 429/503/5xx, сетевых ошибках или задержке выше
+    target_latency оба лимита умножаются на decrease_factor (не чаще раза в
+    cooldown секунд). max_concurrency и max_rate - потолок вежливости, выше
+    которого регулятор не поднимается.
+    """
+
+    def __init__(self, max_concurrency: int = 20, max_rate: float = 20.0,
+                 min_concurrency: int = 1, min_rate: float = 0.5,
+                 initial_concurrency: int = 4, initial_rate: float = 5.0,
+                 target_latency: float = 2.0, decrease_factor: float = 0.5,
+                 cooldown: float = 2.0):
+        self.max_concurrency = max_concurrency
+        self.max_rate = max_rate
+        self.min_concurrency = min_concurrency
+        self.min_rate = min_rate
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+
+        self.concurrency = float(min(initial_concurrency, max_concurrency))
+        self.bucket = TokenBucket(min(initial_rate, max_rate))
+        self.in_flight = 0
+        self.latency_ewma = None
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.stats = {"ok": 0, "congested": 0, "decreases": 0}
+        self._lock = Lock()
+
+    def try_acquire(self) -> float:
+        """Занимает слот и токен; если нельзя - возвращает, сколько подождать"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            if self.in_flight >= int(self.concurrency):
+                return 0.05
+            wait = self.bucket.try_take()
+            if wait > 0:
+                return wait
+            self.in_flight += 1
+            return 0.0
+
+    def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def release(self, latency: float, status_code: Optional[int],
+                retry_after: Optional[float] = None):
+        """status_code=None означает сетевую ошибку/таймаут"""
+        with self._lock:
+            self.in_flight -= 1
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma = 0.8 * self.latency_ewma + 0.2 * latency
+
+            congested = (
+                status_code is None
+                or status_code == 429
+                or status_code >= 500
+                or self.latency_ewma > self.target_latency
+            )
+            now = time.monotonic()
+
+            if not congested:
+                self.stats["ok"] += 1
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+                rate = self.bucket.rate
+                self.bucket.set_rate(min(self.max_rate, rate + 1.0 / max(rate, 1.0)))
+                return
+
+            self.stats["congested"] += 1
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+            if now - self.last_decrease < self.cooldown:
+                return
+            self.last_decrease = now
+            self.stats["decreases"] += 1
+            self.concurrency = max(self.min_concurrency, self.concurrency * self.decrease_factor)
+            self.bucket.set_rate(max(self.min_rate, self.bucket.rate * self.decrease_factor))
+            print(f"[RATE] Снижаем нагрузку: параллельно {int(self.concurrency)}, "
+                  f"{self.bucket.rate:.1f} rps (HTTP {status_code}, latency {self.latency_ewma:.2f}s)")
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "concurrency": int(self.concurrency),
+                "rate": round(self.bucket.rate, 2),
+                "in_flight": self.in_flight,
+                "latency_ewma": round(self.latency_ewma or 0.0, 3),
+                **self.stats,
+            }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        # HTTP-date в Retry-After opennet не присылает, такие значения игнорируем
+        return None
@@ -0,0 +1,201 @@
+import asyncio
+import heapq
+import logging
+import random
+import time
+from collections import deque
+from threading import Condition, Lock
+from typing import Iterable, Optional, Tuple
+
+from fetch_state import STATUS_ERROR
+
+log = logging.getLogger("scraper")
+
+
+class CircuitBreaker:
+    """
+    Размыкатель: после failure_threshold временных ошибок подряд считаем, что
+    сайт лежит, и приостанавливаем весь обход на reset_timeout секунд. Затем
+    пропускаем один пробный запрос (half-open): успех замыкает цепь, неудача
+    снова размыкает её с удвоенным таймаутом (не больше max_reset_timeout).
+    """
+
+    def __init__(self, failure_threshold: int = 20, reset_timeout: float = 30.0,
+                 max_reset_timeout: float = 600.0):
+        self.failure_threshold = failure_threshold
+        self.base_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self._lock = Lock()
+
+    def wait_time(self) -> float:
+        """0 - можно слать запрос, иначе сколько секунд подождать"""
+        with self._lock:
+            if self.state == "closed":
+                return 0.0
+            if self.state == "open":
+                remaining = self.opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    return remaining
+                self.state = "half_open"
+            if self.probe_in_flight:
+                return 0.5
+            self.probe_in_flight = True
+            return 0.0
+
+    def record(self, ok: bool):
+        with self._lock:
+            if ok:
+                if self.state != "closed":
+                    print("[BREAKER] Сайт снова отвечает, продолжаем обход")
+                self.state = "closed"
+                self.failures = 0
+                self.reset_timeout = self.base_timeout
+                self.probe_in_flight = False
+                return
+
+            self.failures += 1
+            if self.state == "half_open":
+                self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+                self._open()
+            elif self.state == "closed" and self.failures >= self.failure_threshold:
+                self._open()
+
+    def release_probe(self):
+        """Пробный запрос завершился без ответа о сайте (сбой загрузчика): пропускаем следующий"""
+        with self._lock:
+            if self.state == "half_open":
+                self.probe_in_flight = False
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.probe_in_flight = False
+        print(f"[BREAKER] {self.failures} ошибок подряд, пауза обхода на {self.reset_timeout:.0f} сек.")
+
+
+class RetryQueue:
+    """
+    Очередь номеров для загрузчиков с повторами. Временные ошибки (STATUS_ERROR)
+    возвращаются в очередь с экспоненциальной задержкой и полным джиттером,
+    пока не исчерпано max_attempts; 404 и прочие окончательные ответы
+    не повторяются. Пока разомкнут CircuitBreaker, новые номера не выдаются.
+    """
+
+    def __init__(self, nums: Iterable[int], max_attempts: int = 3,
+                 base_delay: float = 1.0, max_delay: float = 60.0,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker
+        self.retried = 0
+        self._ready = deque(nums)
+        self._delayed = []
+        self._attempts = {}
+        self._in_flight = 0
+        self._aborted = False
+        # Номер, ушедший пробным запросом half-open
+        self._probe = None
+        self._cond = Condition()
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def try_get(self) -> Tuple[Optional[int], float]:
+        """(номер, 0) или (None, сколько ждать); (None, -1) - работа закончена"""
+        with self._cond:
+            if self._aborted:
+                return None, -1.0
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                self._ready.append(heapq.heappop(self._delayed)[1])
+
+            if self._ready:
+                wait = self.breaker.wait_time() if self.breaker else 0.0
+                if wait > 0:
+                    return None, wait
+                self._in_flight += 1
+                num = self._ready.popleft()
+                if self.breaker and self.breaker.state == "half_open":
+                    self._probe = num
+                return num, 0.0
+
+            if self._delayed:
+                return None, self._delayed[0][0] - now
+            if self._in_flight:
+                # Номер в работе может вернуться на повтор
+                return None, 1.0
+            return None, -1.0
+
+    def get(self) -> Optional[int]:
+        while True:
+            num, wait = self.try_get()
+            if num is not None:
+                return num
+            if wait < 0:
+                return None
+            with self._cond:
+                self._cond.wait(min(wait, 1.0))
+
+    async def get_async(self) -> Optional[int]:
+        while True:
+            num, wait = self.try_get()
+            if num is not None:
+                return num
+            if wait < 0:
+                return None
+            await asyncio.sleep(min(wait, 1.0))
+
+    def abort(self):
+        """Остановить обход: новые и отложенные номера больше не выдаются"""
+        with self._cond:
+            self._aborted = True
+            self._ready.clear()
+            self._delayed.clear()
+            self._cond.notify_all()
+
+    def depth(self, name: str) -> int:
+        """Глубина очереди для метрик: ready, delayed или in_flight"""
+        with self._cond:
+            if name == "ready":
+                return len(self._ready)
+            if name == "delayed":
+                return len(self._delayed)
+            return self._in_flight
+
+    def complete(self, num: int, status: str, host_ok: Optional[bool] = None) -> bool:
+        """
+        True - результат окончательный, False - номер поставлен на повтор.
+        host_ok - ответил ли сайт (сетевые ошибки, 5xx и 429 - нет); breaker
+        учитывает только его, ошибки разбора и пула о сайте ничего не говорят.
+        """
+        with self._cond:
+            probe = num == self._probe
+            if probe:
+                self._probe = None
+        if self.breaker and host_ok is not None:
+            self.breaker.record(host_ok)
+        elif self.breaker and probe:
+            # Иначе probe_in_flight не сбросится и try_get будет ждать вечно
+            self.breaker.release_probe()
+
+        with self._cond:
+            self._in_flight -= 1
+            attempt = self._attempts.get(num, 0) + 1
+            self._attempts[num] = attempt
+
+            final = status != STATUS_ERROR or attempt >= self.max_attempts
+            if not final:
+                delay = self.backoff(attempt)
+                heapq.heappush(self._delayed, (time.monotonic() + delay, num))
+                self.retried += 1
+                log.info("[RETRY] %s: попытка %s/%s через %.1f сек.", num, attempt + 1, self.max_attempts, delay)
+            else:
+                self._attempts.pop(num, None)
+            self._cond.notify_all()
+            return final
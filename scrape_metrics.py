@@ -0,0 +1,261 @@
+import bisect
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Границы корзин гистограмм в секундах: от сотен микросекунд (normalize)
+# до таймаута запроса (transfer)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по верхней границе корзины"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        # Выше последней границы: точнее не сказать, отдаём её
+        return self.buckets[-1]
+
+
+class ScrapeMetrics:
+    """
+    Счётчики, гистограммы задержек по стадиям и датчики глубины очередей.
+    Стадии: dns, connect (только backend asyncio - у requests этих событий
+    не видно), ttfb (до заголовков ответа), transfer (чтение тела), parse,
+    normalize, write. Отдаётся текстом Prometheus (serve) или периодическими
+    JSON-снимками (start_snapshots).
+    """
+
+    def __init__(self):
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self.gauges: Dict[str, Dict[LabelKey, Callable[[], float]]] = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = _key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = _key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram()
+            hist.observe(seconds)
+
+    def stage(self, stage: str, seconds: float):
+        self.observe("stage_seconds", seconds, stage=stage)
+
+    def gauge(self, name: str, func: Callable[[], float], **labels):
+        """Датчик снимается в момент выгрузки, например длина очереди"""
+        with self._lock:
+            self.gauges.setdefault(name, {})[_key(labels)] = func
+
+    def _read_gauges(self) -> Dict[str, Dict[LabelKey, float]]:
+        with self._lock:
+            gauges = {name: dict(series) for name, series in self.gauges.items()}
+        values = {}
+        for name, series in gauges.items():
+            values[name] = {}
+            for key, func in series.items():
+                try:
+                    values[name][key] = float(func())
+                except Exception:
+                    # Датчик мог пережить свой объект (очередь уже закрыта)
+                    continue
+        return values
+
+    def snapshot(self) -> Dict:
+        gauges = self._read_gauges()
+        with self._lock:
+            return {
+                "time": round(time.time(), 3),
+                "uptime": round(time.time() - self.started, 3),
+                "counters": {
+                    name: [{**dict(key), "value": v} for key, v in series.items()]
+                    for name, series in self.counters.items()
+                },
+                "histograms": {
+                    name: [{
+                        **dict(key),
+                        "count": h.count,
+                        "sum": round(h.sum, 6),
+                        "p50": h.quantile(0.5),
+                        "p95": h.quantile(0.95),
+                        "p99": h.quantile(0.99),
+                    } for key, h in series.items()]
+                    for name, series in self.histograms.items()
+                },
+                "gauges": {
+                    name: [{**dict(key), "value": v} for key, v in series.items()]
+                    for name, series in gauges.items()
+                },
+            }
+
+    def prometheus(self, prefix: str = "scraper_") -> str:
+        gauges = self._read_gauges()
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {prefix}{name} counter")
+                for key, value in series.items():
+                    lines.append(f"{prefix}{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {prefix}{name} histogram")
+                for key, h in series.items():
+                    cumulative = 0
+                    for bound, n in zip(h.buckets, h.counts):
+                        cumulative += n
+                        le = _format_labels(key, 'le="%g"' % bound)
+                        lines.append(f"{prefix}{name}_bucket{le} {cumulative}")
+                    le = _format_labels(key, 'le="+Inf"')
+                    lines.append(f"{prefix}{name}_bucket{le} {h.count}")
+                    lines.append(f"{prefix}{name}_sum{_format_labels(key)} {h.sum:.6f}")
+                    lines.append(f"{prefix}{name}_count{_format_labels(key)} {h.count}")
+        for name, series in sorted(gauges.items()):
+            lines.append(f"# TYPE {prefix}{name} gauge")
+            for key, value in series.items():
+                lines.append(f"{prefix}{name}{_format_labels(key)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """/metrics - текст Prometheus, /metrics.json - снимок в JSON"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = metrics.prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(metrics.snapshot(), ensure_ascii=False).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"[METRICS] http://{host}:{server.server_port}/metrics")
+        return server
+
+    def start_snapshots(self, path: str, interval: float = 10.0) -> Callable[[], None]:
+        """Дописывает снимок строкой JSON каждые interval секунд; возвращает stop(), пишущий последний снимок"""
+        stop_event = threading.Event()
+
+        def write_snapshot():
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(self.snapshot(), ensure_ascii=False) + "\n")
+
+        def loop():
+            while not stop_event.wait(interval):
+                write_snapshot()
+            write_snapshot()
+
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+
+        def stop():
+            stop_event.set()
+            thread.join()
+
+        return stop
+
+
+class StageClock:
+    """
+    Накопитель времени стадии внутри одного потока, когда стадия размазана
+    по многим мелким вызовам (clean_text на заголовке, тексте, каждом теге).
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def track(self, func: Callable) -> Callable:
+        local = self._local
+
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                local.total = getattr(local, "total", 0.0) + time.perf_counter() - started
+
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__wrapped__ = func
+        return wrapper
+
+    def take(self) -> float:
+        """Накопленное в этом потоке время с обнулением"""
+        total = getattr(self._local, "total", 0.0)
+        self._local.total = 0.0
+        return total
+
+
+# Общие экземпляры процесса: скрапер пишет сюда, CLI выставляет наружу
+METRICS = ScrapeMetrics()
+NORMALIZE_CLOCK = StageClock()
+
+
+def error_class(exc: Optional[BaseException] = None, status_code: Optional[int] = None) -> str:
+    """Класс ошибки для счётчика errors_total"""
+    if status_code is not None:
+        if status_code == 429:
+            return "http_429"
+        if status_code >= 500:
+            return "http_5xx"
+        return "http_4xx"
+    name = type(exc).__name__.lower() if exc else ""
+    if "timeout" in name:
+        return "timeout"
+    if "connect" in name or "connection" in name or "dns" in name or "resolve" in name:
+        return "connection"
+    return "other"
@@ -1,145 +1,55 @@
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import time
 import json
 import re
-import html
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock
-from typing import Optional, List, Dict
+import os
+import logging
+import asyncio
+import argparse
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from queue import Queue
+from threading import Lock, Semaphore, Thread
+from typing import Optional, List, Dict, Callable, Tuple
+
+from corpus_io import open_sink, sort_jsonl
+from fetch_state import FetchStateStore, STATUS_OK, STATUS_MISSING, STATUS_ERROR
+from html_cache import HtmlCache
+from rate_control import AdaptiveLimiter, parse_retry_after
+from retry import RetryQueue, CircuitBreaker
+from charset import CharsetResolver
+from discovery import GapMap, find_newest, filter_candidates
+from dedup import DedupIndex
+from scrape_metrics import METRICS, NORMALIZE_CLOCK, error_class
+import lxml_extract
+from text_normalizer import (
+    INVISIBLE, remove_control_chars, normalize_spaces, fix_word_glues,
+    is_lat, is_cyr, is_digit, clean_text, insert_spaces_around_tags,
+)
+
+# Время нормализации копится по потоку и уходит в стадию normalize
+clean_text = NORMALIZE_CLOCK.track(clean_text)
+insert_spaces_around_tags = NORMALIZE_CLOCK.track(insert_spaces_around_tags)
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
 
 
 BASE_URL = "https://www.opennet.ru/opennews/art.shtml?num={}"
+NUM_RE = re.compile(r"num=(\d+)")
+REQUEST_TIMEOUT = 10
+KEEPALIVE_TIMEOUT = 30
+# Построчные [REQ]/[ERROR]/[PROGRESS] идут через logging и гасятся уровнем
+log = logging.getLogger("scraper")
 
-INVISIBLE = {
-    "\u200B", "\u200C", "\u200D", "\uFEFF", "\u00AD"
-}
-
-def remove_control_chars(text: str) -> str:
-    out = []
-    for ch in text:
-        code = ord(ch)
-        if code < 32 or code == 127:
-            continue
-        if ch in INVISIBLE:
-            continue
-        out.append(ch)
-    return "".join(out)
-
-def normalize_spaces(text: str) -> str:
-    result = []
-    was_space = False
-    for ch in text:
-        if ch.isspace():
-            was_space = True
-        else:
-            if was_space and result:
-                result.append(" ")
-            result.append(ch)
-            was_space = False
-    return "".join(result).strip()
-
-def clean_text(text: str) -> str:
-    if not text:
-        return ""
-
-    text = html.unescape(text)
-    text = fix_word_glues(text)
-    text = remove_control_chars(text)
-    text = normalize_spaces(text)
-
-    return text
-
-def is_lat(ch):
-    return 'A' <= ch <= 'Z' or 'a' <= ch <= 'z'
-
-def is_cyr(ch):
-    return ('А' <= ch <= 'Я') or ('а' <= ch <= 'я') or ch in "ёЁ"
-
-def is_digit(ch):
-    return '0' <= ch <= '9'
-
-def fix_word_glues(text: str) -> str:
-    out = []
-    i = 0
-    L = len(text)
-
-    while i < L:
-        ch = text[i]
-        if i+1 < L and ch == '.' and (i > 0) and text[i-1].isalnum() and text[i+1].isupper():
-            out.append('. ')
-            i += 1
-            continue
-
-        if ch == ')' and i+1 < L and text[i+1].isupper():
-            out.append(') ')
-            i += 1
-            continue
-
-        if is_cyr(ch) and i+1 < L and is_lat(text[i+1]):
-            j = i+2
-            while j < L and is_lat(text[j]):
-                j += 1
-            out.append(ch + " ")
-            i += 1
-            continue
-
-        
-        if is_lat(ch) and i+1 < L and is_cyr(text[i+1]):
-
-            j = i+1
-            while j < L and is_lat(text[j]):
-                j += 1
-            out.append(ch + " ")
-            i += 1
-            continue
-
-        if is_digit(ch) and i > 0 and (is_lat(text[i-1]) or is_cyr(text[i-1])):
-            prev = text[i-1]
-            if not (prev in "Dd"):
-                out.append(" " + ch)
-                i += 1
-                continue
-
-        if i+1 < L and is_digit(text[i+1]) and (is_lat(ch) or is_cyr(ch)):
-            if ch not in "Dd":
-                out.append(ch + " ")
-                i += 1
-                continue
-
-        out.append(ch)
-        i += 1
-
-    return normalize_spaces("".join(out))
-
-def insert_spaces_around_tags(html: str) -> str:
-    out = []
-    L = len(html)
-    i = 0
-
-    while i < L:
-        ch = html[i]
-
-
-        if ch == '<' and i > 0 and html[i-1].isalnum():
-            out.append(" <")
-            i += 1
-            continue
-
-        if ch == '>' and i+1 < L and html[i+1].isalnum():
-            out.append("> ")
-            i += 1
-            continue
-
-        out.append(ch)
-        i += 1
-
-    text = "".join(out)
-
-    text = fix_word_glues(text)
-
-    return text
-
+# "lxml" - однопроходный разбор на lxml XPath, "bs4" - эталонный BeautifulSoup
+DEFAULT_PARSER = "lxml"
 
 
 def extract_article_text(soup: BeautifulSoup) -> Optional[str]:
@@ -188,25 +98,8 @@ def extract_article_keywords(soup: BeautifulSoup) -> List[str]:
 
 
 
-def fetch_article(num: int, delay: float = 0.1) -> Optional[Dict]:
-    url = BASE_URL.format(num)
-    print(f"[REQ] {num}: {url}")
-
-    if delay > 0:
-        time.sleep(delay)
-
-    try:
-        r = requests.get(url, timeout=10)
-    except requests.exceptions.RequestException as e:
-        print(f"[ERROR] {num}: {e}")
-        return None
-
-    if r.status_code != 200:
-        print(f"[ERROR] {num}: HTTP {r.status_code}")
-        return None
-
-    r.encoding = r.apparent_encoding
-    soup = BeautifulSoup(r.text, "lxml")
+def parse_article_bs4(num: int, url: str, page_html: str) -> Optional[Dict]:
+    soup = BeautifulSoup(page_html, "lxml")
 
     text = extract_article_text(soup)
     if not text:
@@ -224,31 +117,728 @@ def fetch_article(num: int, delay: float = 0.1) -> Optional[Dict]:
     }
 
 
+PARSERS = {
+    "bs4": parse_article_bs4,
+    "lxml": lxml_extract.parse_article,
+}
+
+
+def parse_article(num: int, url: str, page_html: str,
+                  parser: str = DEFAULT_PARSER) -> Optional[Dict]:
+    return PARSERS[parser](num, url, page_html)
+
+
+# Кодировка ищется по цепочке заголовок -> <meta> -> выученная для раздела -> детектор
+CHARSET = CharsetResolver()
+
+
+def detect_encoding(body: bytes, content_type: Optional[str] = None,
+                    url: Optional[str] = None) -> str:
+    return CHARSET.resolve(body, content_type, url)
+
+
+def decode_body(body: bytes, encoding: Optional[str] = None) -> str:
+    return body.decode(encoding or detect_encoding(body), errors="replace")
+
 
-def scrape_range(start_num: int, amount: int,
-                 max_workers: int = 20, request_delay: float = 0.1) -> List[Dict]:
-    nums = list(range(start_num, start_num - amount, -1))
+def make_session(pool_size: int = 20) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def classify_http_status(status_code: int) -> str:
+    # 404/410 - статьи нет и не будет, остальное считаем временной ошибкой
+    if status_code in (404, 410):
+        return STATUS_MISSING
+    return STATUS_ERROR
+
+
+def host_outcome(status_code: Optional[int]) -> bool:
+    """Для CircuitBreaker: False - сайт не отвечает (сетевая ошибка, 5xx, 429), иначе True"""
+    return status_code is not None and status_code < 500 and status_code != 429
+
+
+def parse_page_timed(num: int, url: str, body: bytes,
+                     parser: str = DEFAULT_PARSER,
+                     encoding: Optional[str] = None) -> Tuple[str, Optional[Dict], Dict[str, float]]:
+    """Как parse_page, но времена стадий возвращаются, а не пишутся в METRICS (для пула процессов)"""
+    NORMALIZE_CLOCK.take()
+    started = time.perf_counter()
+    article = parse_article(num, url, decode_body(body, encoding), parser=parser)
+    normalize = NORMALIZE_CLOCK.take()
+    timings = {"parse": time.perf_counter() - started - normalize, "normalize": normalize}
+    return (STATUS_OK if article else STATUS_MISSING), article, timings
+
+
+def record_stages(timings: Dict[str, float]):
+    for stage, seconds in timings.items():
+        METRICS.stage(stage, seconds)
+
+
+def parse_page(num: int, url: str, body: bytes,
+               parser: str = DEFAULT_PARSER,
+               encoding: Optional[str] = None) -> Tuple[str, Optional[Dict]]:
+    status, article, timings = parse_page_timed(num, url, body, parser=parser, encoding=encoding)
+    record_stages(timings)
+    return status, article
+
+
+def record_response(num: int, status_code: Optional[int], exc: Optional[BaseException] = None):
+    METRICS.inc("responses_total", code=status_code if status_code is not None else "none")
+    if exc is not None:
+        METRICS.inc("errors_total", kind=error_class(exc))
+        log.warning("[ERROR] %s: %r", num, exc)
+    elif status_code not in (200, 304):
+        if classify_http_status(status_code) == STATUS_MISSING:
+            # Удалённая статья - обычное дело, в ошибки не считаем
+            log.debug("[MISSING] %s: HTTP %s", num, status_code)
+            return
+        METRICS.inc("errors_total", kind=error_class(status_code=status_code))
+        log.warning("[ERROR] %s: HTTP %s", num, status_code)
+
+
+def fetch_page(num: int, delay: float = 0.1,
+               session: Optional[requests.Session] = None,
+               cache: Optional[HtmlCache] = None,
+               limiter: Optional[AdaptiveLimiter] = None) -> Tuple[str, Optional[bytes], Optional[str], bool]:
+    """
+    (статус, тело, кодировка, host_ok); кодировка определяется здесь, пока под
+    рукой заголовки, host_ok - ответил ли сайт (см. host_outcome)
+    """
+    url = BASE_URL.format(num)
+    log.debug("[REQ] %s: %s", num, url)
+
+    # С регулятором темп задаёт он, фиксированная пауза не нужна
+    if limiter:
+        waited = time.monotonic()
+        limiter.acquire()
+        METRICS.stage("throttle", time.monotonic() - waited)
+    elif delay > 0:
+        time.sleep(delay)
+
+    http = session or requests
+    headers = cache.conditional_headers(url) if cache is not None else {}
+    started = time.monotonic()
+    try:
+        r = http.get(url, timeout=REQUEST_TIMEOUT, headers=headers)
+    except requests.exceptions.RequestException as e:
+        if limiter:
+            limiter.release(time.monotonic() - started, None)
+        record_response(num, None, e)
+        return STATUS_ERROR, None, None, False
+
+    # elapsed у requests - время до разбора заголовков, остальное - чтение тела
+    total = time.monotonic() - started
+    ttfb = r.elapsed.total_seconds()
+    METRICS.stage("ttfb", ttfb)
+    METRICS.stage("transfer", max(0.0, total - ttfb))
+    record_response(num, r.status_code)
+
+    if limiter:
+        limiter.release(total, r.status_code,
+                        parse_retry_after(r.headers.get("Retry-After")))
+
+    host_ok = host_outcome(r.status_code)
+    if r.status_code == 304 and cache is not None:
+        cached = cache.load(url)
+        if cached is None:
+            return STATUS_ERROR, None, None, host_ok
+        body, content_type = cached
+        return STATUS_OK, body, detect_encoding(body, content_type, url), host_ok
+
+    if r.status_code != 200:
+        return classify_http_status(r.status_code), None, None, host_ok
+
+    if cache is not None:
+        cache.put(url, r.content, r.headers)
+    return STATUS_OK, r.content, detect_encoding(r.content, r.headers.get("Content-Type"), url), host_ok
+
+
+def fetch_article_status(num: int, delay: float = 0.1,
+                         session: Optional[requests.Session] = None,
+                         cache: Optional[HtmlCache] = None,
+                         parser: str = DEFAULT_PARSER,
+                         limiter: Optional[AdaptiveLimiter] = None) -> Tuple[str, Optional[Dict], bool]:
+    status, body, encoding, host_ok = fetch_page(num, delay=delay, session=session, cache=cache, limiter=limiter)
+    if body is None:
+        return status, None, host_ok
+    return (*parse_page(num, BASE_URL.format(num), body, parser=parser, encoding=encoding), host_ok)
+
+
+def fetch_article(num: int, delay: float = 0.1,
+                  session: Optional[requests.Session] = None,
+                  cache: Optional[HtmlCache] = None,
+                  parser: str = DEFAULT_PARSER) -> Optional[Dict]:
+    return fetch_article_status(num, delay=delay, session=session, cache=cache, parser=parser)[1]
+
+
+async def fetch_page_async(session, num: int, delay: float = 0.1,
+                           cache: Optional[HtmlCache] = None,
+                           limiter: Optional[AdaptiveLimiter] = None) -> Tuple[str, Optional[bytes], Optional[str], bool]:
+    url = BASE_URL.format(num)
+    log.debug("[REQ] %s: %s", num, url)
+
+    if limiter:
+        waited = time.monotonic()
+        await limiter.acquire_async()
+        METRICS.stage("throttle", time.monotonic() - waited)
+    elif delay > 0:
+        await asyncio.sleep(delay)
+
+    headers = cache.conditional_headers(url) if cache is not None else {}
+    body = None
+    content_type = None
+    status_code = None
+    retry_after = None
+    error = None
+    started = time.monotonic()
+    try:
+        async with session.get(url, headers=headers) as r:
+            METRICS.stage("ttfb", time.monotonic() - started)
+            status_code = r.status
+            retry_after = parse_retry_after(r.headers.get("Retry-After"))
+            if r.status == 200:
+                content_type = r.headers.get("Content-Type")
+                reading = time.monotonic()
+                body = await r.read()
+                METRICS.stage("transfer", time.monotonic() - reading)
+                response_headers = r.headers
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        error = e
+        status_code = None
+    finally:
+        if limiter:
+            limiter.release(time.monotonic() - started, status_code, retry_after)
+    record_response(num, status_code, error)
+
+    # Сжатие и коммит SQLite в кэше - не в цикле событий, иначе стоят все остальные запросы
+    loop = asyncio.get_running_loop()
+    if cache is not None and body is not None:
+        await loop.run_in_executor(None, cache.put, url, body, response_headers)
+
+    host_ok = host_outcome(status_code)
+    if status_code is None:
+        return STATUS_ERROR, None, None, host_ok
+
+    if status_code == 304 and cache is not None:
+        cached = await loop.run_in_executor(None, cache.load, url)
+        if cached is None:
+            return STATUS_ERROR, None, None, host_ok
+        body, content_type = cached
+    elif status_code != 200:
+        return classify_http_status(status_code), None, None, host_ok
+
+    return STATUS_OK, body, detect_encoding(body, content_type, url), host_ok
+
+
+async def fetch_article_status_async(session, num: int, delay: float = 0.1,
+                                     cache: Optional[HtmlCache] = None,
+                                     parser: str = DEFAULT_PARSER,
+                                     limiter: Optional[AdaptiveLimiter] = None) -> Tuple[str, Optional[Dict], bool]:
+    status, body, encoding, host_ok = await fetch_page_async(session, num, delay=delay, cache=cache, limiter=limiter)
+    if body is None:
+        return status, None, host_ok
+
+    # Парсинг уводим из event loop, чтобы не тормозить чтение остальных сокетов
+    loop = asyncio.get_running_loop()
+    status, article = await loop.run_in_executor(
+        None, parse_page, num, BASE_URL.format(num), body, parser, encoding)
+    return status, article, host_ok
+
+
+async def fetch_article_async(session, num: int, delay: float = 0.1,
+                              cache: Optional[HtmlCache] = None,
+                              parser: str = DEFAULT_PARSER) -> Optional[Dict]:
+    return (await fetch_article_status_async(
+        session, num, delay=delay, cache=cache, parser=parser))[1]
+
+
+
+# (номер, статус, статья, host_ok); host_ok=None - исход ничего не говорит о сайте
+ResultCallback = Callable[[int, str, Optional[Dict], Optional[bool]], None]
+
+
+def make_trace_config():
+    """DNS и установка соединения видны только через трассировку aiohttp"""
+    trace = aiohttp.TraceConfig()
+
+    async def dns_start(session, ctx, params):
+        ctx.dns_started = time.monotonic()
+
+    async def dns_end(session, ctx, params):
+        METRICS.stage("dns", time.monotonic() - ctx.dns_started)
+
+    async def connect_start(session, ctx, params):
+        ctx.connect_started = time.monotonic()
+
+    async def connect_end(session, ctx, params):
+        METRICS.stage("connect", time.monotonic() - ctx.connect_started)
+        METRICS.inc("connections_total")
+
+    trace.on_dns_resolvehost_start.append(dns_start)
+    trace.on_dns_resolvehost_end.append(dns_end)
+    trace.on_connection_create_start.append(connect_start)
+    trace.on_connection_create_end.append(connect_end)
+    return trace
+
+
+async def scrape_nums_async(work: RetryQueue, on_result: ResultCallback,
+                            max_workers: int = 20, request_delay: float = 0.1,
+                            per_host_limit: Optional[int] = None,
+                            cache: Optional[HtmlCache] = None,
+                            parser: str = DEFAULT_PARSER,
+                            limiter: Optional[AdaptiveLimiter] = None):
+    if aiohttp is None:
+        raise RuntimeError("Для backend='asyncio' нужен пакет aiohttp")
+
+    connector = aiohttp.TCPConnector(
+        limit=max_workers,
+        limit_per_host=per_host_limit or max_workers,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=300,
+    )
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                     trace_configs=[make_trace_config()]) as session:
+        async def worker():
+            while True:
+                num = await work.get_async()
+                if num is None:
+                    return
+                status, article, host_ok = await fetch_article_status_async(
+                    session, num, delay=request_delay, cache=cache, parser=parser,
+                    limiter=limiter)
+                on_result(num, status, article, host_ok)
+
+        await asyncio.gather(*(worker() for _ in range(max_workers)))
+
+
+def scrape_nums_threads(work: RetryQueue, on_result: ResultCallback,
+                        max_workers: int = 20, request_delay: float = 0.1,
+                        per_host_limit: Optional[int] = None,
+                        cache: Optional[HtmlCache] = None,
+                        parser: str = DEFAULT_PARSER,
+                        limiter: Optional[AdaptiveLimiter] = None):
+    session = make_session(pool_size=per_host_limit or max_workers)
+
+    def worker():
+        while True:
+            num = work.get()
+            if num is None:
+                return
+            status, article, host_ok = fetch_article_status(
+                num, delay=request_delay, session=session, cache=cache, parser=parser,
+                limiter=limiter)
+            on_result(num, status, article, host_ok)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for future in as_completed([executor.submit(worker) for _ in range(max_workers)]):
+            future.result()
+
+    session.close()
+
+
+_DONE = object()
+# Сколько раз подряд (без единой разобранной страницы) пересоздаём упавший пул
+# парсеров, прежде чем остановить обход, и сколько раз переразбираем одну страницу
+MAX_POOL_RESTARTS = 5
+PARSE_RESUBMITS = 2
+
+
+def scrape_nums_pipeline(work: RetryQueue, on_result: ResultCallback,
+                         max_workers: int = 20, request_delay: float = 0.1,
+                         per_host_limit: Optional[int] = None,
+                         cache: Optional[HtmlCache] = None,
+                         parser: str = DEFAULT_PARSER,
+                         limiter: Optional[AdaptiveLimiter] = None,
+                         parse_workers: Optional[int] = None,
+                         queue_size: int = 200):
+    """
+    Конвейер fetch -> parse -> write. Потоки ввода-вывода только скачивают
+    страницы и кладут сырые тела в ограниченную очередь, парсинг идёт в пуле
+    процессов, а результаты отдаются on_result в вызывающем потоке.
+    Пока в работе queue_size страниц (в очереди, в парсинге или в ожидании
+    записи), загрузчики блокируются - это и есть backpressure между стадиями.
+    """
+    parse_workers = parse_workers or os.cpu_count() or 1
+    raw_queue = Queue(maxsize=queue_size)
+    out_queue = Queue()
+    slots = Semaphore(queue_size)
+    session = make_session(pool_size=per_host_limit or max_workers)
+    METRICS.gauge("queue_depth", raw_queue.qsize, queue="raw")
+    METRICS.gauge("queue_depth", out_queue.qsize, queue="parsed")
+
+    def fetcher():
+        while True:
+            num = work.get()
+            if num is None:
+                return
+            try:
+                status, body, encoding, host_ok = fetch_page(num, delay=request_delay, session=session,
+                                                             cache=cache, limiter=limiter)
+            except Exception as e:
+                METRICS.inc("errors_total", kind="fetch_crash")
+                log.warning("[ERROR] %s: %r", num, e)
+                status, body, encoding, host_ok = STATUS_ERROR, None, None, None
+            if body is None:
+                out_queue.put((num, status, None, False, host_ok))
+                continue
+            slots.acquire()
+            raw_queue.put((num, BASE_URL.format(num), body, parser, encoding))
+
+    # spawn, а не fork: к моменту создания процессов уже работают потоки загрузчиков
+    mp_context = multiprocessing.get_context("spawn")
+    pools = [ProcessPoolExecutor(max_workers=parse_workers, mp_context=mp_context)]
+    pool_state = {"restarts": 0, "aborted": False}
+    pool_lock = Lock()
+    # В пуле не больше двух страниц на процесс: его падение задевает только их,
+    # остальные ждут в raw_queue
+    in_pool = Semaphore(parse_workers * 2)
+
+    def restart_pool(broken) -> Optional[ProcessPoolExecutor]:
+        """
+        Умерший процесс (например, OOM) ломает весь пул. Пересоздаём его, иначе
+        каждая следующая страница уходит в ошибку, перекачивается и размыкает
+        breaker. Если пул падает раз за разом, останавливаем обход.
+        """
+        with pool_lock:
+            if pools[-1] is broken and not pool_state["aborted"]:
+                pool_state["restarts"] += 1
+                METRICS.inc("errors_total", kind="parse_pool")
+                if pool_state["restarts"] > MAX_POOL_RESTARTS:
+                    pool_state["aborted"] = True
+                    work.abort()
+                    log.error("[ERROR] Пул парсеров упал %s раз подряд, обход остановлен", pool_state["restarts"])
+                else:
+                    log.warning("[POOL] Пул парсеров упал, пересоздаём (%s/%s)",
+                                pool_state["restarts"], MAX_POOL_RESTARTS)
+                    pools.append(ProcessPoolExecutor(max_workers=parse_workers, mp_context=mp_context))
+            return None if pool_state["aborted"] else pools[-1]
+
+    def submit(item, resubmits=0):
+        pool = pools[-1]
+        while pool is not None:
+            try:
+                future = pool.submit(parse_page_timed, *item)
+            except BrokenProcessPool:
+                pool = restart_pool(pool)
+                continue
+            future.add_done_callback(partial(on_parsed, item, pool, resubmits))
+            return
+        in_pool.release()
+        out_queue.put((item[0], STATUS_ERROR, None, True, None))
+
+    def on_parsed(item, pool, resubmits, future):
+        num = item[0]
+        try:
+            status, article, timings = future.result()
+            record_stages(timings)
+            with pool_lock:
+                pool_state["restarts"] = 0
+        except BrokenProcessPool as e:
+            # Страницы, бывшие в пуле при падении, разбираем заново в новом пуле (тело уже
+            # скачано); если пул раз за разом падает на одной, её, видимо, и роняет сама страница
+            if resubmits < PARSE_RESUBMITS and restart_pool(pool) is not None:
+                submit(item, resubmits + 1)
+                return
+            log.warning("[ERROR] %s: пул парсеров упал на странице: %r", num, e)
+            status, article = STATUS_ERROR, None
+        except Exception as e:
+            METRICS.inc("errors_total", kind="parse")
+            log.warning("[ERROR] %s: парсинг упал: %r", num, e)
+            status, article = STATUS_ERROR, None
+        in_pool.release()
+        # Тело скачано - сайт ответил, даже если сломался разбор
+        out_queue.put((num, status, article, True, True))
+
+    def dispatcher():
+        while True:
+            item = raw_queue.get()
+            if item is _DONE:
+                out_queue.put(_DONE)
+                break
+            in_pool.acquire()
+            submit(item)
+
+    def fetch_stage():
+        with ThreadPoolExecutor(max_workers=max_workers) as fetchers:
+            for _ in range(max_workers):
+                fetchers.submit(fetcher)
+        raw_queue.put(_DONE)
+
+    stages = [Thread(target=fetch_stage, daemon=True),
+              Thread(target=dispatcher, daemon=True)]
+    for t in stages:
+        t.start()
+
+    # Загрузчики завершаются только когда в RetryQueue не осталось номеров в работе,
+    # т.е. после того как здесь обработан последний результат; затем приходит _DONE
+    while True:
+        item = out_queue.get()
+        if item is _DONE:
+            break
+        num, status, article, held_slot, host_ok = item
+        if held_slot:
+            slots.release()
+        on_result(num, status, article, host_ok)
+
+    for t in stages:
+        t.join()
+    for pool in pools:
+        pool.shutdown(cancel_futures=pool_state["aborted"])
+
+    session.close()
+
+
+BACKENDS = {
+    "threads": scrape_nums_threads,
+    "asyncio": lambda work, on_result, **kwargs: asyncio.run(scrape_nums_async(work, on_result, **kwargs)),
+    "pipeline": scrape_nums_pipeline,
+}
+
+
+def scrape_nums(nums: List[int],
+                max_workers: int = 20, request_delay: float = 0.1,
+                backend: str = "threads",
+                per_host_limit: Optional[int] = None,
+                on_article: Optional[Callable[[Dict], None]] = None,
+                state: Optional[FetchStateStore] = None,
+                cache: Optional[HtmlCache] = None,
+                parser: str = DEFAULT_PARSER,
+                limiter: Optional[AdaptiveLimiter] = None,
+                max_attempts: int = 3,
+                breaker: Optional[CircuitBreaker] = None,
+                gap_map: Optional[GapMap] = None,
+                dedup: Optional[DedupIndex] = None,
+                **backend_options) -> List[Dict]:
+    # Если задан on_article (например, JsonlSink), статьи отдаются ему сразу после
+    # парсинга и в памяти не копятся, а scrape_range возвращает пустой список.
+    # Если задан state, уже скачанные и отсутствующие номера пропускаются.
+    # Если задан limiter, темп и параллелизм подбирает он (в пределах max_workers),
+    # а request_delay не используется.
+    # Временные ошибки повторяются до max_attempts раз с экспоненциальной задержкой,
+    # а breaker останавливает обход, если сайт лёг.
+    # Если задан gap_map, в него записываются номера без статей.
+    # Если задан dedup, почти-дубликаты получают поле dup_of с id оригинала.
+    # backend_options уходят в сам backend (например, parse_workers для pipeline).
+    if backend not in BACKENDS:
+        raise ValueError(f"Неизвестный backend: {backend}")
+
+    amount = len(nums)
+    if state:
+        # Коммит состояния только вместе со сбросом sink: иначе после kill
+        # номер остаётся ok, а его статья пропадает в буфере файла
+        state.before_commit = getattr(on_article, "flush", None)
+        nums = state.pending(nums)
+        print(f"[STATE] Пропущено уже обработанных: {amount - len(nums)}, к загрузке: {len(nums)}")
+
+    print(f"[SCRAPER] Backend: {backend}, Потоки: {max_workers}, Статей: {amount}")
+
+    work = RetryQueue(nums, max_attempts=max_attempts,
+                      breaker=breaker if breaker is not None else CircuitBreaker())
+    for name in ("ready", "delayed", "in_flight"):
+        METRICS.gauge("queue_depth", partial(work.depth, name), queue=f"retry_{name}")
+    if limiter:
+        METRICS.gauge("limiter_concurrency", lambda: limiter.concurrency)
+        METRICS.gauge("limiter_rate", lambda: limiter.bucket.rate)
     results = []
     results_lock = Lock()
+    done = 0
+
+    def on_result(num, status, article, host_ok=None):
+        nonlocal done
+        if not work.complete(num, status, host_ok):
+            METRICS.inc("retries_total")
+            return
+        METRICS.inc("pages_total", status=status)
+        sig = None
+        if dedup is not None and article:
+            # Сигнатура считается вне общей блокировки, под ней - только поиск в LSH
+            started = time.perf_counter()
+            sig = dedup.signature(article["content"])
+            METRICS.stage("dedup", time.perf_counter() - started)
+        with results_lock:
+            if sig is not None and dedup.check(article, sig):
+                METRICS.inc("duplicates_total")
+            started = time.perf_counter()
+            if article:
+                if on_article:
+                    on_article(article)
+                else:
+                    results.append(article)
+            # Отмечаем номер только после того, как статья ушла в sink
+            if state:
+                state.mark(num, status)
+            METRICS.stage("write", time.perf_counter() - started)
+            if gap_map:
+                if status == STATUS_MISSING:
+                    gap_map.add(num)
+                elif status == STATUS_OK:
+                    gap_map.discard(num)
+            done += 1
+            if done % 10 == 0:
+                log.info("[PROGRESS] %s/%s", done, len(nums))
+
+    BACKENDS[backend](
+        work, on_result,
+        max_workers=max_workers, request_delay=request_delay,
+        per_host_limit=per_host_limit, cache=cache, parser=parser, limiter=limiter,
+        **backend_options,
+    )
 
-    print(f"[SCRAPER] Потоки: {max_workers}, Статей: {amount}")
+    if state:
+        state.flush()
+        # sink закрывается вызывающим кодом, дальше коммиты состояния его не трогают
+        state.before_commit = None
+        print(f"[STATE] {state.stats()}")
+    if limiter:
+        print(f"[RATE] {limiter.snapshot()}")
+    if work.retried:
+        print(f"[RETRY] Повторов: {work.retried}")
+    if gap_map:
+        gap_map.save()
+    if dedup is not None:
+        print_dedup_summary(dedup, results, streamed=on_article is not None)
+    print(f"[CHARSET] {CHARSET.snapshot()['paths']}")
+    print_stage_summary()
+
+    results.sort(key=lambda x: int(x['id']), reverse=True)
+    if on_article is None:
+        print(f"[DONE] Собрано статей: {len(results)}")
+    return results
 
-    def worker(num):
-        article = fetch_article(num, delay=request_delay)
-        if article:
-            with results_lock:
-                results.append(article)
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(worker, num): num for num in nums}
 
-        for i, future in enumerate(as_completed(futures), start=1):
-            if i % 10 == 0:
-                print(f"[PROGRESS] {i}/{len(nums)}")
+def print_stage_summary():
+    for item in METRICS.snapshot()["histograms"].get("stage_seconds", []):
+        print(f"[METRICS] {item['stage']}: {item['count']} шт., "
+              f"p50 {item['p50'] * 1000:g} мс, p95 {item['p95'] * 1000:g} мс, всего {item['sum']:.2f} сек.")
 
 
+def print_dedup_summary(dedup: DedupIndex, results: List[Dict], streamed: bool):
+    # Оригинал группы мог смениться после того, как её статьи уже получили метки
+    relabeled = sum(dedup.relabel(article) for article in results)
+    print(f"[DEDUP] Проверено: {dedup.checked}, почти-дубликатов: {dedup.duplicates}, в индексе: {len(dedup)}, "
+          f"переназначено групп: {dedup.repointed}, исправлено меток: {relabeled}")
+    if streamed and dedup.repointed:
+        if dedup.path:
+            print(f"[DEDUP] Метки dup_of в потоковом файле устарели: исправьте их через "
+                  f"--sort IN OUT --dedup-index {dedup.path}")
+        else:
+            print("[DEDUP] Метки dup_of в потоковом файле устарели; чтобы их исправить, запускайте с --dedup-index")
+    dedup.save()
+
+
+def scrape_range(start_num: int, amount: int, **kwargs) -> List[Dict]:
+    """Обход номеров от start_num вниз; параметры - как у scrape_nums"""
+    return scrape_nums(list(range(start_num, start_num - amount, -1)), **kwargs)
+
+
+def head_exists(num: int, session: Optional[requests.Session] = None,
+                delay: float = 0.1,
+                limiter: Optional[AdaptiveLimiter] = None,
+                breaker: Optional[CircuitBreaker] = None) -> Optional[bool]:
+    """
+    Дешёвая проба без тела ответа: True/False по статусу, None если ответ
+    непонятен. Пробы - такие же запросы к сайту, поэтому подчиняются тем же
+    паузе, регулятору и размыкателю, что и загрузка статей.
+    """
+    if breaker is not None:
+        while True:
+            wait = breaker.wait_time()
+            if wait <= 0:
+                break
+            time.sleep(min(wait, 1.0))
+    if limiter:
+        limiter.acquire()
+    elif delay > 0:
+        time.sleep(delay)
+
+    http = session or requests
+    started = time.monotonic()
+    try:
+        r = http.head(BASE_URL.format(num), timeout=REQUEST_TIMEOUT, allow_redirects=False)
+    except requests.exceptions.RequestException:
+        if limiter:
+            limiter.release(time.monotonic() - started, None)
+        if breaker is not None:
+            breaker.record(False)
+        return None
+    if limiter:
+        limiter.release(time.monotonic() - started, r.status_code,
+                        parse_retry_after(r.headers.get("Retry-After")))
+    if breaker is not None:
+        breaker.record(host_outcome(r.status_code))
+    if r.status_code == 200:
+        return True
+    if classify_http_status(r.status_code) == STATUS_MISSING:
+        return False
+    return None
+
+
+def discover_nums(amount: int, hint: int,
+                  gap_map: Optional[GapMap] = None,
+                  state: Optional[FetchStateStore] = None,
+                  head_probe: bool = True,
+                  probe_workers: int = 10,
+                  delay: float = 0.1,
+                  limiter: Optional[AdaptiveLimiter] = None,
+                  breaker: Optional[CircuitBreaker] = None) -> List[int]:
+    """
+    Вместо слепого диапазона от захардкоженного START_NUM: находим свежайший
+    номер (экспоненциальный + бинарный поиск по HEAD), берём amount номеров
+    вниз от него и выкидываем известные дыры и номера, которые HEAD считает
+    отсутствующими. Если сервер отвечает 200 на любые номера, HEAD ничего не
+    отсеет и обход просто пройдёт по всем номерам.
+    """
+    session = make_session(pool_size=probe_workers)
+    probe = partial(head_exists, session=session, delay=delay, limiter=limiter, breaker=breaker)
+    newest = find_newest(probe, hint)
+
+    nums = list(range(newest, newest - amount, -1))
+    if state:
+        nums = state.pending(nums)
+    nums = filter_candidates(nums, gap_map, exists=probe if head_probe else None,
+                             probe_workers=probe_workers)
+    session.close()
+    if gap_map:
+        print(f"[DISCOVERY] Дыр в карте: {gap_map.missing_count()}")
+        gap_map.save()
+    return nums
+
+
+def replay_cache(cache: HtmlCache,
+                 on_article: Optional[Callable[[Dict], None]] = None,
+                 parser: str = DEFAULT_PARSER,
+                 dedup: Optional[DedupIndex] = None) -> List[Dict]:
+    """Только стадия парсинга: прогоняет закэшированные страницы без обращения к сайту"""
+    results = []
+    total = 0
+    for url, body, content_type in cache.iter_entries():
+        m = NUM_RE.search(url)
+        if not m:
+            continue
+        total += 1
+        encoding = detect_encoding(body, content_type, url)
+        _status, article = parse_page(int(m.group(1)), url, body, parser=parser, encoding=encoding)
+        if article:
+            if dedup is not None:
+                dedup.check(article)
+            if on_article:
+                on_article(article)
+            else:
+                results.append(article)
+
     results.sort(key=lambda x: int(x['id']), reverse=True)
-    print(f"[DONE] Собрано статей: {len(results)}")
+    if dedup is not None:
+        print_dedup_summary(dedup, results, streamed=on_article is not None)
+    print(f"[CHARSET] {CHARSET.snapshot()['paths']}")
+    print_stage_summary()
+    print(f"[REPLAY] Страниц в кэше: {total}, статей: {len(results) if on_article is None else '-'}")
     return results
 
 
@@ -265,15 +855,141 @@ if __name__ == "__main__":
     LIMIT = 10000
     MAX_WORKERS = 20
     REQUEST_DELAY = 0.1
+    BACKEND = "asyncio" if aiohttp is not None else "threads"
+    MAX_RATE = 20.0
+
+    arg_parser = argparse.ArgumentParser(description="Скрапер новостей opennet.ru")
+    arg_parser.add_argument("--start", type=int, default=START_NUM)
+    arg_parser.add_argument("--limit", type=int, default=LIMIT)
+    arg_parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    arg_parser.add_argument("--delay", type=float, default=REQUEST_DELAY)
+    arg_parser.add_argument("--backend", choices=sorted(BACKENDS), default=BACKEND)
+    arg_parser.add_argument("--parse-workers", type=int, default=None,
+                                help="процессов-парсеров для --backend pipeline (по умолчанию число ядер)")
+    arg_parser.add_argument("--queue-size", type=int, default=200,
+                                help="сколько страниц может одновременно находиться между стадиями pipeline")
+    arg_parser.add_argument("--adaptive", action="store_true",
+                            help="AIMD-регулятор темпа вместо фиксированной паузы --delay")
+    arg_parser.add_argument("--max-rate", type=float, default=MAX_RATE,
+                            help="потолок вежливости для --adaptive, запросов в секунду")
+    arg_parser.add_argument("--retries", type=int, default=3,
+                            help="сколько всего попыток на номер при временных ошибках")
+    arg_parser.add_argument("--discover", action="store_true",
+                            help="найти свежайший номер от --start и обходить --limit номеров вниз от него")
+    arg_parser.add_argument("--gap-map", default=None,
+                            help="JSON с известными дырами в нумерации (например, gaps.json)")
+    arg_parser.add_argument("--no-head-probe", action="store_true",
+                            help="в режиме --discover не проверять номера HEAD-запросами перед GET")
+    arg_parser.add_argument("--charset-map", default=None,
+                            help="JSON с выученными кодировками разделов сайта (например, charsets.json)")
+    arg_parser.add_argument("--parser", choices=sorted(PARSERS), default=DEFAULT_PARSER,
+                            help="lxml - быстрый однопроходный разбор, bs4 - эталонный BeautifulSoup")
+    arg_parser.add_argument("--out", default=None,
+                            help="файл результата (по умолчанию opennet_news.json или opennet_news.jsonl в режиме --stream)")
+    arg_parser.add_argument("--stream", action="store_true",
+                            help="писать статьи сразу после парсинга в JSONL (.jsonl/.jsonl.gz/.jsonl.zst) "
+                                 "или компактный корпус с индексом по id (.corpus)")
+    arg_parser.add_argument("--sort", nargs=2, metavar=("IN", "OUT"),
+                            help="только отсортировать корпус по id и выйти (OUT=*.json даёт JSON-массив, "
+                                 "OUT=*.corpus - компактный корпус)")
+    arg_parser.add_argument("--state", default=None,
+                            help="SQLite-файл состояния для докачки (например, scrape_state.sqlite), только с --stream")
+    arg_parser.add_argument("--cache", default=None,
+                            help="каталог кэша сырых HTML (например, html_cache), включает условные запросы")
+    arg_parser.add_argument("--replay", action="store_true",
+                            help="не ходить в сеть, а только распарсить страницы из --cache")
+    arg_parser.add_argument("--dedup", action="store_true",
+                            help="помечать почти-дубликаты статей полем dup_of (MinHash + LSH)")
+    arg_parser.add_argument("--dedup-index", default=None,
+                            help="файл сигнатур для дедупликации между запусками (например, dedup.bin), включает --dedup")
+    arg_parser.add_argument("--dedup-threshold", type=float, default=0.8,
+                            help="порог сходства Жаккара для почти-дубликата")
+    arg_parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                            help="DEBUG - печатать каждый запрос [REQ], WARNING - только ошибки")
+    arg_parser.add_argument("--metrics-port", type=int, default=None,
+                            help="отдавать метрики в формате Prometheus на http://127.0.0.1:PORT/metrics")
+    arg_parser.add_argument("--metrics-json", default=None,
+                            help="дописывать JSON-снимки метрик в файл (например, metrics.jsonl)")
+    arg_parser.add_argument("--metrics-interval", type=float, default=10.0,
+                            help="период JSON-снимков, сек.")
+    args = arg_parser.parse_args()
+
+    if args.state and not args.stream:
+        arg_parser.error("--state работает только вместе с --stream, иначе результат перезапишет прошлые статьи")
+    if args.replay and not args.cache:
+        arg_parser.error("--replay требует --cache")
+
+    logging.basicConfig(level=args.log_level, format="%(message)s")
+    if args.metrics_port is not None:
+        METRICS.serve(args.metrics_port)
+    stop_snapshots = METRICS.start_snapshots(args.metrics_json, args.metrics_interval) if args.metrics_json else None
 
     t0 = time.time()
-
-    news = scrape_range(
-        START_NUM,
-        LIMIT,
-        max_workers=MAX_WORKERS,
-        request_delay=REQUEST_DELAY
-    )
-
-    save_json(news)
+    if args.charset_map:
+        CHARSET = CharsetResolver(args.charset_map)
+    cache = HtmlCache(args.cache) if args.cache else None
+    dedup = None
+    if args.dedup or args.dedup_index:
+        dedup = DedupIndex(args.dedup_index, threshold=args.dedup_threshold)
+
+    if args.sort:
+        # С --dedup-index метки dup_of приводятся к итоговым оригиналам групп
+        n = sort_jsonl(args.sort[0], args.sort[1], dedup=dedup)
+        print(f"[FILE] Отсортировано {n} статей: {args.sort[1]}")
+    elif args.replay and args.stream:
+        out = args.out or "opennet_news.jsonl"
+        with open_sink(out, append=False) as sink:
+            replay_cache(cache, on_article=sink, parser=args.parser, dedup=dedup)
+        print(f"[DONE] Записано статей: {sink.count} в {out}")
+    elif args.replay:
+        save_json(replay_cache(cache, parser=args.parser, dedup=dedup), args.out or "opennet_news.json")
+    else:
+        scrape_kwargs = dict(
+            max_workers=args.workers,
+            request_delay=args.delay,
+            backend=args.backend,
+            cache=cache,
+            parser=args.parser,
+            max_attempts=args.retries,
+            dedup=dedup,
+        )
+        if args.adaptive:
+            scrape_kwargs["limiter"] = AdaptiveLimiter(max_concurrency=args.workers, max_rate=args.max_rate)
+        # Один размыкатель на пробы и загрузку: если сайт лёг во время поиска номеров, обход подождёт
+        scrape_kwargs["breaker"] = CircuitBreaker()
+        if args.backend == "pipeline":
+            scrape_kwargs.update(parse_workers=args.parse_workers, queue_size=args.queue_size)
+
+        gap_map = GapMap(args.gap_map) if args.gap_map else None
+        state = FetchStateStore(args.state) if args.state else None
+        if gap_map:
+            scrape_kwargs["gap_map"] = gap_map
+
+        if args.discover:
+            nums = discover_nums(args.limit, args.start, gap_map=gap_map, state=state,
+                                 head_probe=not args.no_head_probe,
+                                 probe_workers=min(10, args.workers), delay=args.delay,
+                                 limiter=scrape_kwargs.get("limiter"),
+                                 breaker=scrape_kwargs["breaker"])
+        else:
+            nums = list(range(args.start, args.start - args.limit, -1))
+            if gap_map:
+                nums = filter_candidates(nums, gap_map)
+
+        if args.stream:
+            out = args.out or "opennet_news.jsonl"
+            with open_sink(out) as sink:
+                scrape_nums(nums, on_article=sink, state=state, **scrape_kwargs)
+            print(f"[DONE] Записано статей: {sink.count} в {out}")
+        else:
+            news = scrape_nums(nums, **scrape_kwargs)
+            save_json(news, args.out or "opennet_news.json")
+        if state:
+            state.close()
+
+    if cache is not None:
+        cache.close()
+    CHARSET.save()
+    if stop_snapshots:
+        stop_snapshots()
     print(f"[TIME] {time.time() - t0:.2f} сек.")
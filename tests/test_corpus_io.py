@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from corpus_io import JsonlSink, iter_jsonl, sort_jsonl
+
+# Пишет статьи с id от start и умирает без закрытия файла, как при kill
+KILLED_WRITER = """
+import os, sys
+sys.path.insert(0, {root!r})
+from corpus_io import JsonlSink
+sink = JsonlSink({path!r}, append=True, flush_every=50)
+for i in range({start}, {start} + {count}):
+    sink.write({{"id": str(i), "content": "текст " * 20}})
+os._exit(1)
+"""
+
+
+def run_killed(path, start, count):
+    code = KILLED_WRITER.format(root=ROOT, path=path, start=start, count=count)
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 1
+
+
+def test_gzip_resume_after_kill(tmp_path):
+    path = str(tmp_path / "out.jsonl.gz")
+    run_killed(path, 0, 120)
+    # Докачка после kill дописывает к оборванному файлу
+    run_killed(path, 1000, 120)
+    with JsonlSink(path) as sink:
+        for i in range(2000, 2120):
+            sink.write({"id": str(i), "content": "текст"})
+
+    ids = [int(a["id"]) for a in iter_jsonl(path)]
+    # Из каждого убитого запуска читается всё, что было сброшено на диск
+    assert ids[:100] == list(range(100))
+    assert ids[ids.index(1000):ids.index(1000) + 100] == list(range(1000, 1100))
+    assert ids[-120:] == list(range(2000, 2120))
+
+    out = str(tmp_path / "sorted.jsonl")
+    assert sort_jsonl(path, out) == len(set(ids))
+
+
+def test_rewrite_drops_old_parts(tmp_path):
+    path = str(tmp_path / "out.jsonl.gz")
+    run_killed(path, 0, 60)
+    run_killed(path, 100, 60)
+    with JsonlSink(path, append=False) as sink:
+        sink.write({"id": "1", "content": "текст"})
+    assert [a["id"] for a in iter_jsonl(path)] == ["1"]
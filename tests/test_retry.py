@@ -0,0 +1,44 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fetch_state import STATUS_ERROR, STATUS_OK
+from retry import CircuitBreaker, RetryQueue
+
+
+def open_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record(False)
+    assert breaker.state == "open"
+    return breaker
+
+
+def test_probe_released_after_fetcher_crash():
+    breaker = open_breaker()
+    work = RetryQueue([1, 2], max_attempts=1, breaker=breaker)
+    num, wait = work.try_get()
+    assert (num, wait) == (1, 0.0)
+    assert breaker.state == "half_open" and breaker.probe_in_flight
+    # Загрузчик упал: исход о сайте ничего не говорит
+    work.complete(num, STATUS_ERROR, None)
+    assert not breaker.probe_in_flight
+    num, wait = work.try_get()
+    assert (num, wait) == (2, 0.0)
+    work.complete(num, STATUS_OK, True)
+    assert breaker.state == "closed"
+    assert work.try_get() == (None, -1.0)
+
+
+def test_non_probe_crash_keeps_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    work = RetryQueue([1, 2, 3], max_attempts=1, breaker=breaker)
+    before, _ = work.try_get()
+    breaker.record(False)
+    probe, _ = work.try_get()
+    assert breaker.state == "half_open" and probe == 2
+    assert work.try_get() == (None, 0.5)
+    # Сбой номера, взятого до размыкания, не пропускает второй пробный запрос
+    work.complete(before, STATUS_ERROR, None)
+    assert breaker.probe_in_flight
+    work.complete(probe, STATUS_ERROR, False)
+    assert breaker.state == "open"
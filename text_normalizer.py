@@ -0,0 +1,226 @@
+import html
+import re
+import sys
+
+
+# ---------------------------------------------------------------------------
+# Эталонные посимвольные реализации. Ими пользовался scraper.py до появления
+# компилированного нормализатора; оставлены для сверки (bench_normalizer.py).
+# ---------------------------------------------------------------------------
+
+INVISIBLE = {
+    "\u200B", "\u200C", "\u200D", "\uFEFF", "\u00AD"
+}
+
+def remove_control_chars(text: str) -> str:
+    out = []
+    for ch in text:
+        code = ord(ch)
+        if code < 32 or code == 127:
+            continue
+        if ch in INVISIBLE:
+            continue
+        out.append(ch)
+    return "".join(out)
+
+def normalize_spaces(text: str) -> str:
+    result = []
+    was_space = False
+    for ch in text:
+        if ch.isspace():
+            was_space = True
+        else:
+            if was_space and result:
+                result.append(" ")
+            result.append(ch)
+            was_space = False
+    return "".join(result).strip()
+
+def clean_text_reference(text: str) -> str:
+    if not text:
+        return ""
+
+    text = html.unescape(text)
+    text = fix_word_glues(text)
+    text = remove_control_chars(text)
+    text = normalize_spaces(text)
+
+    return text
+
+def is_lat(ch):
+    return 'A' <= ch <= 'Z' or 'a' <= ch <= 'z'
+
+def is_cyr(ch):
+    return ('А' <= ch <= 'Я') or ('а' <= ch <= 'я') or ch in "ёЁ"
+
+def is_digit(ch):
+    return '0' <= ch <= '9'
+
+def fix_word_glues(text: str) -> str:
+    out = []
+    i = 0
+    L = len(text)
+
+    while i < L:
+        ch = text[i]
+        if i+1 < L and ch == '.' and (i > 0) and text[i-1].isalnum() and text[i+1].isupper():
+            out.append('. ')
+            i += 1
+            continue
+
+        if ch == ')' and i+1 < L and text[i+1].isupper():
+            out.append(') ')
+            i += 1
+            continue
+
+        if is_cyr(ch) and i+1 < L and is_lat(text[i+1]):
+            j = i+2
+            while j < L and is_lat(text[j]):
+                j += 1
+            out.append(ch + " ")
+            i += 1
+            continue
+
+        
+        if is_lat(ch) and i+1 < L and is_cyr(text[i+1]):
+
+            j = i+1
+            while j < L and is_lat(text[j]):
+                j += 1
+            out.append(ch + " ")
+            i += 1
+            continue
+
+        if is_digit(ch) and i > 0 and (is_lat(text[i-1]) or is_cyr(text[i-1])):
+            prev = text[i-1]
+            if not (prev in "Dd"):
+                out.append(" " + ch)
+                i += 1
+                continue
+
+        if i+1 < L and is_digit(text[i+1]) and (is_lat(ch) or is_cyr(ch)):
+            if ch not in "Dd":
+                out.append(ch + " ")
+                i += 1
+                continue
+
+        out.append(ch)
+        i += 1
+
+    return normalize_spaces("".join(out))
+
+def insert_spaces_around_tags_reference(html: str) -> str:
+    out = []
+    L = len(html)
+    i = 0
+
+    while i < L:
+        ch = html[i]
+
+
+        if ch == '<' and i > 0 and html[i-1].isalnum():
+            out.append(" <")
+            i += 1
+            continue
+
+        if ch == '>' and i+1 < L and html[i+1].isalnum():
+            out.append("> ")
+            i += 1
+            continue
+
+        out.append(ch)
+        i += 1
+
+    text = "".join(out)
+
+    text = fix_word_glues(text)
+
+    return text
+
+
+
+
+# ---------------------------------------------------------------------------
+# Компилированный нормализатор: тот же результат, что у эталона, но без
+# посимвольных циклов на Python.
+#
+# Все правила fix_word_glues смотрят только на соседей в исходной строке и
+# вставляют пробел на стыке двух символов (правило "буква-цифра" срабатывает
+# с обеих сторон одного и того же стыка), а финальный normalize_spaces
+# схлопывает лишние пробелы. Поэтому fix_word_glues = вставка пробела во все
+# стыки, найденные одним регулярным выражением, + split/join.
+# remove_control_chars выполняется после склейки, поэтому удаляемые символы
+# убираются через str.translate уже после вставки пробелов. Пробельные
+# управляющие символы (\t, \n, \x1c..\x1f) эталон сначала превращает в пробел,
+# поэтому из таблицы удаления они исключены - их схлопнет split().
+# ---------------------------------------------------------------------------
+
+def _char_class(pred) -> str:
+    ranges = []
+    start = prev = None
+    for code in range(sys.maxunicode + 1):
+        if pred(chr(code)):
+            if start is None:
+                start = code
+            elif code != prev + 1:
+                ranges.append((start, prev))
+                start = code
+            prev = code
+    if start is not None:
+        ranges.append((start, prev))
+    return "".join(
+        f"\\U{a:08x}" if a == b else f"\\U{a:08x}-\\U{b:08x}" for a, b in ranges
+    )
+
+
+_UPPER = _char_class(str.isupper)
+_LAT = "A-Za-z"
+_CYR = "А-яЁё"
+_ALNUM = r"[^\W_]"  # совпадает с str.isalnum
+
+# Каждая альтернатива захватывает ровно один символ, после которого нужен пробел;
+# проверка соседа справа идёт через lookahead, так что движок быстро отбрасывает
+# позиции по первому символу
+_GLUE = (
+    rf"[A-CE-Za-ce-z](?=[{_CYR}0-9])"          # латиница -> кириллица / цифра
+    rf"|[Dd](?=[{_CYR}])"                      # D/d перед цифрой не отделяются
+    rf"|[{_CYR}](?=[{_LAT}0-9])"               # кириллица -> латиница / цифра
+    rf"|\)(?=[{_UPPER}])"                      # ")Слово"
+    rf"|(?<={_ALNUM})\.(?=[{_UPPER}])"         # "слово.Слово"
+)
+_TAG = rf"|{_ALNUM}(?=<)|>(?={_ALNUM})"
+
+GLUE_RE = re.compile(_GLUE)
+TAG_GLUE_RE = re.compile(_GLUE + _TAG)
+
+_CONTROL_TABLE = {code: None for code in list(range(32)) + [127] + [ord(ch) for ch in INVISIBLE]}
+_DROP_TABLE = {code: None for code in _CONTROL_TABLE if not chr(code).isspace()}
+
+
+def fast_normalize_spaces(text: str) -> str:
+    # str.split() без аргументов режет по тем же символам, что и str.isspace()
+    return " ".join(text.split())
+
+
+def fast_fix_word_glues(text: str) -> str:
+    return " ".join(GLUE_RE.sub(r"\g<0> ", text).split())
+
+
+def fast_remove_control_chars(text: str) -> str:
+    return text.translate(_CONTROL_TABLE)
+
+
+def clean_text(text: str) -> str:
+    if not text:
+        return ""
+
+    text = html.unescape(text)
+    text = GLUE_RE.sub(r"\g<0> ", text)
+    text = text.translate(_DROP_TABLE)
+    return " ".join(text.split())
+
+
+def insert_spaces_around_tags(html: str) -> str:
+    # Пробелы у тегов не создают новых стыков для правил склейки, поэтому оба
+    # набора правил применяются одним проходом
+    return " ".join(TAG_GLUE_RE.sub(r"\g<0> ", html).split())